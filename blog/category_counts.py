@@ -0,0 +1,113 @@
+"""
+Materialised post counts of blog categories.
+
+A category counts the live posts linked to it or to any of its descendant
+categories, every post once, separately for each locale of the posts. The
+counts are kept as BlogCategoryCount rows, so listings read them without
+joining the posts.
+
+Changes to the links between posts and categories, and posts going live or
+not, mark the categories involved. When the transaction commits, those
+categories and their ancestors are counted again. The update_category_counts
+management command rebuilds all counts.
+"""
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+from blog.models import BlogCategory
+from blog.models import BlogCategoryBlogPage
+from blog.models import BlogCategoryCount
+from blog.models import clear_blog_sidebar_cache
+
+_pending = threading.local()
+
+
+def get_category_tree():
+    """
+    ({category id: parent id}, {category id: [child ids]})
+    """
+    parents = dict(BlogCategory.objects.values_list("pk", "parent_id"))
+    children = defaultdict(list)
+    for pk, parent_id in parents.items():
+        if parent_id:
+            children[parent_id].append(pk)
+    return parents, children
+
+
+def get_subtree(category_id, children):
+    subtree = set()
+    stack = [category_id]
+    while stack:
+        pk = stack.pop()
+        # Guards against cycles, which BlogCategory.clean only catches two
+        # levels deep
+        if pk not in subtree:
+            subtree.add(pk)
+            stack.extend(children[pk])
+    return subtree
+
+
+def get_ancestors(category_id, parents):
+    ancestors = set()
+    pk = parents.get(category_id)
+    while pk and pk not in ancestors:
+        ancestors.add(pk)
+        pk = parents.get(pk)
+    return ancestors
+
+
+def update_category_counts(category_ids=None):
+    """
+    Counts the posts of the given categories and their ancestors again, or of
+    all categories if no ids are given.
+    """
+    parents, children = get_category_tree()
+    if category_ids is None:
+        category_ids = set(parents)
+    else:
+        category_ids = {pk for pk in category_ids if pk in parents}
+        for pk in list(category_ids):
+            category_ids |= get_ancestors(pk, parents)
+
+    subtrees = {pk: get_subtree(pk, children) for pk in category_ids}
+    posts = defaultdict(set)
+    for category_id, page_id, locale_id in BlogCategoryBlogPage.objects.filter(
+        page__live=True, category_id__in=set().union(*subtrees.values())
+    ).values_list("category_id", "page_id", "page__locale_id"):
+        posts[category_id].add((page_id, locale_id))
+
+    counts = []
+    for pk, subtree in subtrees.items():
+        per_locale = defaultdict(int)
+        for __, locale_id in set().union(*(posts[sub_pk] for sub_pk in subtree)):
+            per_locale[locale_id] += 1
+        counts += [
+            BlogCategoryCount(category_id=pk, locale_id=locale_id, post_count=count)
+            for locale_id, count in per_locale.items()
+        ]
+
+    with transaction.atomic():
+        BlogCategoryCount.objects.filter(category_id__in=category_ids).delete()
+        BlogCategoryCount.objects.bulk_create(counts)
+    clear_blog_sidebar_cache()
+
+
+def mark_categories(category_ids):
+    """
+    Counts the posts of the given categories again when the current
+    transaction commits, together with all other marked categories.
+    """
+    if not hasattr(_pending, "category_ids"):
+        _pending.category_ids = set()
+    _pending.category_ids |= set(category_ids)
+    # The first callback to run takes all marked categories, the others find
+    # nothing left to do
+    transaction.on_commit(flush_categories)
+
+
+def flush_categories():
+    category_ids = _pending.__dict__.pop("category_ids", None)
+    if category_ids:
+        update_category_counts(category_ids)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blog.category_counts import update_category_counts
+from blog.models import BlogCategoryCount
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the post counts of all blog categories.
+
+    The counts are updated when posts are published or their categories
+    change, so this is only needed to fill them in the first time or after
+    changing links outside of Django.
+    """
+
+    def handle(self, *args, **options):
+        update_category_counts()
+        print(
+            "Counted posts of {} categories".format(
+                BlogCategoryCount.objects.values("category").distinct().count()
+            )
+        )
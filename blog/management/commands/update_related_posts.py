@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog.related import update_related_posts
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the related posts index of all blog pages.
+
+    Publishing, unpublishing or deleting a post only updates its own related
+    posts and those of its neighbours, run this regularly to catch up on the
+    rest.
+    """
+
+    def handle(self, *args, **options):
+        related = update_related_posts()
+        print(
+            "Indexed related posts of {} blog pages, {} relations".format(
+                len(related), sum(len(ids) for ids in related.values())
+            )
+        )
@@ -39,6 +39,7 @@ from library.models import MediaPageRegion
 from library.models import MediaPageTopic
 from library.models import RegionSnippet
 from library.models import TopicSnippet
+from migcontrol.utils import parse_html
 from wiki.models import WikiPage
 
 try:
@@ -785,13 +786,7 @@ class Command(BaseCommand):
             BlogPageTag.objects.get_or_create(tag=tag, content_object=page)[0]
 
     def clean_body(self, body):
-        soup = BeautifulSoup(body, "html5lib")
-        # Beautiful soup unfortunately adds some noise to the structure, so we
-        # remove this again - see:
-        # https://stackoverflow.com/questions/21452823/beautifulsoup-how-should-i-obtain-the-body-contents
-        for attr in ["head", "html", "body"]:
-            if hasattr(soup, attr):
-                getattr(soup, attr).unwrap()
+        soup = parse_html(body)
 
         for element in soup.findAll(lambda tag: not tag.contents and tag.name == "p"):
             element.decompose()
@@ -809,14 +804,7 @@ class Command(BaseCommand):
 
     def body_insert_wiki_links(self, page):
         body = getattr(page, self.body_field_name)
-        soup = BeautifulSoup(body, "html5lib")
-
-        # Beautiful soup unfortunately adds some noise to the structure, so we
-        # remove this again - see:
-        # https://stackoverflow.com/questions/21452823/beautifulsoup-how-should-i-obtain-the-body-contents
-        for attr in ["head", "html", "body"]:
-            if hasattr(soup, attr):
-                getattr(soup, attr).unwrap()
+        soup = parse_html(body)
 
         textNodes = soup.findAll(text=True)
         wiki_link = re.compile(r"^[A-Z].+")
@@ -848,25 +836,14 @@ class Command(BaseCommand):
                     )
 
             if replacements_made:
-                node = BeautifulSoup(new_text, "html5lib")
-                for attr in ["head", "html", "body"]:
-                    if hasattr(node, attr):
-                        getattr(node, attr).unwrap()
-
+                node = parse_html(new_text)
                 textNode.replaceWith(node)
 
         setattr(page, self.body_field_name, str(soup))
         page.save()
 
     def clean_body_final(self, body):
-        soup = BeautifulSoup(body, "html5lib")
-        # Beautiful soup unfortunately adds some noise to the structure, so we
-        # remove this again - see:
-        # https://stackoverflow.com/questions/21452823/beautifulsoup-how-should-i-obtain-the-body-contents
-        for attr in ["head", "html", "body"]:
-            if hasattr(soup, attr):
-                getattr(soup, attr).unwrap()
-        return str(soup)
+        return str(parse_html(body))
 
     def create_blog_pages(  # noqa: max-complexity=12
         self, posts, blog_index, *args, **options
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_blogpage_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBlogPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField()),
+                ('rank', models.PositiveIntegerField()),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_posts', to='blog.blogpage')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.blogpage')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['page', 'rank'], name='blog_relate_page_id_7663b3_idx')],
+                'unique_together': {('page', 'related')},
+            },
+        ),
+    ]
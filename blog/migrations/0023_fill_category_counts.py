@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+from blog.category_counts import get_subtree
+
+
+def fill_category_counts(apps, schema_editor):
+    BlogCategory = apps.get_model("blog.BlogCategory")
+    BlogCategoryBlogPage = apps.get_model("blog.BlogCategoryBlogPage")
+    BlogCategoryCount = apps.get_model("blog.BlogCategoryCount")
+
+    children = defaultdict(list)
+    category_ids = []
+    for pk, parent_id in BlogCategory.objects.values_list("pk", "parent_id"):
+        category_ids.append(pk)
+        if parent_id:
+            children[parent_id].append(pk)
+
+    posts = defaultdict(set)
+    for category_id, page_id, locale_id in BlogCategoryBlogPage.objects.filter(
+        page__live=True
+    ).values_list("category_id", "page_id", "page__locale_id"):
+        posts[category_id].add((page_id, locale_id))
+
+    counts = []
+    for pk in category_ids:
+        per_locale = defaultdict(int)
+        subtree = get_subtree(pk, children)
+        for __, locale_id in set().union(*(posts[sub_pk] for sub_pk in subtree)):
+            per_locale[locale_id] += 1
+        counts += [
+            BlogCategoryCount(category_id=pk, locale_id=locale_id, post_count=count)
+            for locale_id, count in per_locale.items()
+        ]
+
+    BlogCategoryCount.objects.all().delete()
+    BlogCategoryCount.objects.bulk_create(counts, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0022_category_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_category_counts, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,25 @@
 import datetime
 
-from bs4 import BeautifulSoup
 from compressor.css import CssCompressor
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.paginator import EmptyPage
 from django.core.paginator import PageNotAnInteger
 from django.core.paginator import Paginator
 from django.db import models
+from django.db import transaction
 from django.db.models import Count
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.shortcuts import get_object_or_404
+from django.utils import translation
 from django.utils.html import format_html
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
@@ -24,49 +33,163 @@ from wagtail.admin.panels import FieldPanel
 from wagtail.admin.panels import FieldRowPanel
 from wagtail.admin.panels import InlinePanel
 from wagtail.admin.panels import MultiFieldPanel
+from wagtail.coreutils import get_supported_content_language_variant
 from wagtail.documents import get_document_model_string
 from wagtail.fields import RichTextField
 from wagtail.fields import StreamField
 from wagtail.images import get_image_model_string
 from wagtail.images.blocks import ImageChooserBlock
+from wagtail.models import Locale
 from wagtail.models import Page
 from wagtail.models.i18n import TranslatableMixin
 from wagtail.search import index
+from wagtail.signals import page_published
+from wagtail.signals import page_unpublished
+from wagtail.signals import post_page_move
 from wagtail.snippets.models import register_snippet
-from wagtail.templatetags.wagtailcore_tags import richtext
 from wagtail_footnotes.blocks import RichTextBlockWithFootnotes
 
+from blog.pagination import CursorPaginator
+from home.bodies import bodies_refreshed
 from home.models import ArticleBase
-from migcontrol.utils import get_toc
+from home.models import AuthorsMixin
+from home.models import RenderedBodyMixin
+from migcontrol.rich_text import richtext
+from migcontrol.utils import bump_cache_generation
+from migcontrol.utils import get_cache_generation
 
 # from django.utils.translation import ugettext_lazy as _
 
 
 COMMENTS_APP = getattr(settings, "COMMENTS_APP", None)
 
+# Number of related posts shown on a blog page
+BLOG_RELATED_POSTS = getattr(settings, "BLOG_RELATED_POSTS", 5)
+
+
+BLOG_SIDEBAR_CACHE_KEY = "blog-sidebar-{}-{}"
+# The sidebar, blog index and locales are keyed by a generation that changes
+# when they do, the timeout only catches changes that don't send a signal
+# (i.e. renamed users)
+BLOG_SIDEBAR_CACHE_TIMEOUT = getattr(settings, "BLOG_SIDEBAR_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_blog_sidebar(locale):
+    """
+    Authors and categories of the blog in a locale, cached until a blog page
+    is published or unpublished or a category changes.
+    """
+    key = BLOG_SIDEBAR_CACHE_KEY.format(get_cache_generation("blog-sidebar"), locale.pk)
+    sidebar = cache.get(key)
+    if sidebar is None:
+        sidebar = {
+            # Only the names, not whole users with their password hashes
+            "authors": list(
+                get_user_model()
+                .objects.filter(
+                    owned_pages__live=True,
+                    owned_pages__content_type__model="blogpage",
+                    owned_pages__locale=locale,
+                )
+                .values("pk", "first_name", "last_name")
+                .annotate(Count("owned_pages"))
+                .order_by("-owned_pages__count")
+            ),
+            "all_categories": list(
+                BlogCategory.objects.filter(locale=locale).annotate(
+                    blog_count=Coalesce(
+                        Subquery(
+                            BlogCategoryCount.objects.filter(
+                                category=OuterRef("pk"), locale=locale
+                            ).values("post_count")
+                        ),
+                        0,
+                    )
+                )
+            ),
+        }
+        sidebar["root_categories"] = [
+            category
+            for category in sidebar["all_categories"]
+            if category.parent_id is None
+        ]
+        cache.set(key, sidebar, BLOG_SIDEBAR_CACHE_TIMEOUT)
+    return sidebar
+
+
+def clear_blog_sidebar_cache():
+    bump_cache_generation("blog-sidebar")
+
+
+LOCALES_CACHE_KEY = "blog-locales-{}"
+BLOG_INDEX_CACHE_KEY = "blog-index-{}-{}"
+
+
+def get_locales():
+    """
+    {language code: Locale}, cached until a locale changes
+    """
+    key = LOCALES_CACHE_KEY.format(get_cache_generation("blog-index"))
+    locales = cache.get(key)
+    if locales is None:
+        locales = {locale.language_code: locale for locale in Locale.objects.all()}
+        cache.set(key, locales, BLOG_SIDEBAR_CACHE_TIMEOUT)
+    return locales
+
+
+def get_active_locale():
+    """
+    Same as Locale.get_active(), from the cached locales
+    """
+    try:
+        language_code = get_supported_content_language_variant(
+            translation.get_language()
+        )
+    except LookupError:
+        language_code = None
+    return get_locales().get(language_code) or Locale.get_active()
+
+
+def get_blog_index(locale):
+    """
+    The live BlogIndexPage of a locale, or of any locale if it doesn't have
+    one. Cached until a blog index is published, unpublished or deleted or a
+    page is moved.
+    """
+    key = BLOG_INDEX_CACHE_KEY.format(get_cache_generation("blog-index"), locale.pk)
+    index = cache.get(key)
+    if index is None:
+        indexes = BlogIndexPage.objects.live().order_by("path")
+        index = indexes.filter(locale=locale).first() or indexes.first()
+        if index is not None:
+            cache.set(key, index, BLOG_SIDEBAR_CACHE_TIMEOUT)
+    return index
+
+
+def clear_blog_index_cache():
+    bump_cache_generation("blog-index")
+
+
+# Cached blog cards are keyed by the generation, so they never go stale. The
+# timeout is to not keep cards of listings that aren't requested anymore.
+BLOG_CARDS_CACHE_TIMEOUT = getattr(settings, "BLOG_CARDS_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def get_blog_generation():
+    """
+    A token that changes whenever blog content changes, for caches of
+    rendered blog output to include in their keys
+    """
+    return get_cache_generation("blog")
+
+
+def bump_blog_generation():
+    return bump_cache_generation("blog")
+
 
 def get_blog_context(context):
     """Get context data useful on all blog related pages"""
-    context["authors"] = (
-        get_user_model()
-        .objects.filter(
-            owned_pages__live=True, owned_pages__content_type__model="blogpage"
-        )
-        .annotate(Count("owned_pages"))
-        .order_by("-owned_pages__count")
-    )
-    context["all_categories"] = BlogCategory.objects.all()
-    context["root_categories"] = (
-        BlogCategory.objects.filter(
-            parent=None,
-        )
-        .prefetch_related(
-            "children",
-        )
-        .annotate(
-            blog_count=Count("blogpage"),
-        )
-    )
+    context.update(get_blog_sidebar(get_active_locale()))
     return context
 
 
@@ -79,7 +202,7 @@ class BlogIndexPage(ArticleBase, Page):
         # belong to for now, as blogs are not language sensitive
         blogs = BlogPage.objects.all().live()
         blogs = (
-            blogs.order_by("-date")
+            blogs.order_by("-date", "-pk")
             .select_related("owner")
             .prefetch_related(
                 "tagged_items__tag",
@@ -116,36 +239,77 @@ class BlogIndexPage(ArticleBase, Page):
                 category = get_object_or_404(BlogCategory, slug=category)
             blogs = blogs.filter(categories__category__name=category)
         if author:
-            blogs = blogs.filter(authors__icontains=author)
+            blogs = blogs.filter(page_authors__author__slug=author)
         if locale:
             blogs = blogs.filter(locale=locale)
 
-        # Pagination
-        page = request.GET.get("page")
-        page_size = 12
-        if hasattr(settings, "BLOG_PAGINATION_PER_PAGE"):
-            page_size = settings.BLOG_PAGINATION_PER_PAGE
-
-        if page_size is not None:
-            paginator = Paginator(blogs, page_size)  # Show 10 blogs per page
-            try:
-                blogs = paginator.page(page)
-            except PageNotAnInteger:
-                blogs = paginator.page(1)
-            except EmptyPage:
-                blogs = paginator.page(paginator.num_pages)
+        blogs, older_url, newer_url = self.paginate(request, blogs)
 
         context["blogs"] = blogs
+        context["older_url"] = older_url
+        context["newer_url"] = newer_url
         context["category"] = category
         context["locale"] = locale
-        context["categories"] = BlogCategory.objects.all()
         context["tag"] = tag
         context["author"] = author
         context["COMMENTS_APP"] = COMMENTS_APP
+        context["blog_generation"] = get_blog_generation()
+        context["blog_cards_cache_timeout"] = BLOG_CARDS_CACHE_TIMEOUT
         context = get_blog_context(context)
+        context["categories"] = context["all_categories"]
 
         return context
 
+    def paginate(self, request, blogs):
+        """
+        Returns (page of blogs, URL of older posts, URL of newer posts)
+
+        With BLOG_PAGINATION_CURSOR, pages are selected with ?after= and
+        ?before= cursors instead of ?page= numbers, see blog.pagination.
+        Links with a ?page= number keep working.
+        """
+        page_size = getattr(settings, "BLOG_PAGINATION_PER_PAGE", 12)
+        if page_size is None:
+            return blogs, None, None
+
+        query = request.GET.copy()
+        for key in ["page", "after", "before"]:
+            query.pop(key, None)
+
+        def get_url(key, value):
+            params = query.copy()
+            params[key] = value
+            return "?" + params.urlencode()
+
+        # Numbered pages are still paginated by number, i.e. from old links
+        cursor = getattr(settings, "BLOG_PAGINATION_CURSOR", False)
+        if cursor and not request.GET.get("page"):
+            paginator = CursorPaginator(blogs, page_size)
+            try:
+                blogs = paginator.page(
+                    after=request.GET.get("after"), before=request.GET.get("before")
+                )
+            except ValueError:
+                blogs = paginator.page()
+            return (
+                blogs,
+                blogs.has_next() and get_url("after", blogs.next_cursor),
+                blogs.has_previous() and get_url("before", blogs.previous_cursor),
+            )
+
+        paginator = Paginator(blogs, page_size)
+        try:
+            blogs = paginator.page(request.GET.get("page"))
+        except PageNotAnInteger:
+            blogs = paginator.page(1)
+        except EmptyPage:
+            blogs = paginator.page(paginator.num_pages)
+        return (
+            blogs,
+            blogs.has_next() and get_url("page", blogs.next_page_number()),
+            blogs.has_previous() and get_url("page", blogs.previous_page_number()),
+        )
+
     class Meta:
         verbose_name = "Blog index"
 
@@ -203,6 +367,28 @@ class BlogCategory(TranslatableMixin, models.Model):
         return super(BlogCategory, self).save(*args, **kwargs)
 
 
+class BlogCategoryCount(models.Model):
+    """
+    Number of live posts in a locale linked to a category or its descendants.
+    See blog.category_counts
+    """
+
+    category = models.ForeignKey(
+        BlogCategory,
+        on_delete=models.CASCADE,
+        related_name="counts",
+    )
+    locale = models.ForeignKey(
+        Locale,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    post_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [("category", "locale")]
+
+
 class BlogCategoryBlogPage(models.Model):
     category = models.ForeignKey(
         BlogCategory,
@@ -231,7 +417,7 @@ class BlogTag(Tag):
         proxy = True
 
 
-class BlogPage(Page):
+class BlogPage(AuthorsMixin, RenderedBodyMixin, Page):
     body_richtext = RichTextField(
         verbose_name=_("body (HTML)"),
         blank=True,
@@ -332,32 +518,10 @@ class BlogPage(Page):
     def some_image(self):
         return self.header_image
 
-    def get_body(self):
+    def render_body(self):
         if self.body_richtext:
-            body = richtext(self.body_richtext)
-        else:
-            body = "".join([str(f.value) for f in self.body_mixed])
-
-        # Now let's add some id=... attributes to all h{1,2,3,4,5}
-        soup = BeautifulSoup(body, "html5lib")
-
-        # Beautiful soup unfortunately adds some noise to the structure, so we
-        # remove this again - see:
-        # https://stackoverflow.com/questions/21452823/beautifulsoup-how-should-i-obtain-the-body-contents
-        for attr in ["head", "html", "body"]:
-            if hasattr(soup, attr):
-                getattr(soup, attr).unwrap()
-
-        for element in soup.find_all(["h1", "h2", "h3", "h4", "h5"]):
-            element["id"] = "header-" + slugify(element.text, allow_unicode=True)
-
-        return str(soup)
-
-    def get_toc(self):
-        """
-        [(name, [*children])]
-        """
-        return get_toc(self.get_body())
+            return richtext(self.body_richtext)
+        return "".join([str(f.value) for f in self.body_mixed])
 
     def save_revision(self, *args, **kwargs):
         return super(BlogPage, self).save_revision(*args, **kwargs)
@@ -369,9 +533,20 @@ class BlogPage(Page):
         # Find closest ancestor which is a blog index
         return self.get_ancestors().type(BlogIndexPage).last()
 
+    def get_related_posts(self):
+        """
+        The live related posts from the precomputed index, best first
+        """
+        return [
+            related.related
+            for related in self.related_posts.filter(related__live=True)
+            .select_related("related")
+            .order_by("rank")[:BLOG_RELATED_POSTS]
+        ]
+
     def get_context(self, request, *args, **kwargs):
         context = super(BlogPage, self).get_context(request, *args, **kwargs)
-        context["blogs"] = self.get_blog_index().blogindexpage.blogs
+        context["related_posts"] = self.get_related_posts()
         context = get_blog_context(context)
         context["COMMENTS_APP"] = COMMENTS_APP
         return context
@@ -379,6 +554,9 @@ class BlogPage(Page):
     class Meta:
         verbose_name = "Blog page"
         verbose_name_plural = "Blog pages"
+        # For listing posts by date and the keyset pagination of
+        # BlogIndexPage, page_ptr is the id
+        indexes = [models.Index(fields=["date", "page_ptr"])]
 
     parent_page_types = ["blog.BlogIndexPage"]
 
@@ -427,6 +605,32 @@ class WordpressMapping(models.Model):
     )
 
 
+class RelatedBlogPage(models.Model):
+    """
+    Precomputed related posts of a blog page, scored by the number of tags and
+    categories they have in common. See blog.related
+    """
+
+    page = models.ForeignKey(
+        "BlogPage",
+        on_delete=models.CASCADE,
+        related_name="related_posts",
+    )
+    related = models.ForeignKey(
+        "BlogPage",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    score = models.PositiveIntegerField()
+    # Position in the page's list, ties in score are broken by date
+    rank = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["rank"]
+        unique_together = [("page", "related")]
+        indexes = [models.Index(fields=["page", "rank"])]
+
+
 BlogPage.content_panels = [
     FieldPanel("title", classname="full title"),
     MultiFieldPanel(
@@ -443,6 +647,67 @@ BlogPage.content_panels = [
 ]
 
 
+@receiver(page_published, sender=BlogPage)
+@receiver(page_unpublished, sender=BlogPage)
+@receiver(post_delete, sender=BlogPage)
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+def blog_sidebar_changed(sender, **kwargs):
+    clear_blog_sidebar_cache()
+    bump_blog_generation()
+
+
+@receiver(page_published, sender=BlogIndexPage)
+@receiver(page_unpublished, sender=BlogIndexPage)
+@receiver(post_delete, sender=BlogIndexPage)
+@receiver(post_page_move)
+@receiver(post_save, sender=Locale)
+@receiver(post_delete, sender=Locale)
+def blog_index_changed(sender, **kwargs):
+    clear_blog_index_cache()
+    bump_blog_generation()
+
+
+@receiver(post_save, sender=BlogCategoryBlogPage)
+@receiver(post_delete, sender=BlogCategoryBlogPage)
+def blog_category_link_changed(sender, instance, **kwargs):
+    from blog.category_counts import mark_categories
+
+    mark_categories([instance.category_id])
+
+
+@receiver(page_published, sender=BlogPage)
+@receiver(page_unpublished, sender=BlogPage)
+def blog_page_live_changed(sender, instance, **kwargs):
+    from blog.category_counts import mark_categories
+
+    mark_categories(instance.categories.values_list("category_id", flat=True))
+
+
+@receiver(post_save, sender=BlogCategory)
+def blog_category_changed(sender, **kwargs):
+    from blog.category_counts import update_category_counts
+
+    # The category may have moved in the tree, which changes the counts of
+    # its old and new ancestors
+    transaction.on_commit(update_category_counts)
+
+
+@receiver(page_published, sender=BlogPage)
+@receiver(page_unpublished, sender=BlogPage)
+@receiver(pre_delete, sender=BlogPage)
+def blog_related_posts_changed(sender, instance, **kwargs):
+    from blog.related import mark_posts
+
+    mark_posts([instance.pk])
+
+
+@receiver(bodies_refreshed, sender=BlogPage)
+def blog_bodies_refreshed(sender, **kwargs):
+    # Feeds include the bodies
+    bump_blog_generation()
+
+
 @hooks.register("insert_global_admin_css")
 def import_fontawesome_stylesheet():
     elem = '<link rel="stylesheet" type="text/x-scss" href="{}scss/fontawesome.scss">'.format(
@@ -0,0 +1,112 @@
+"""
+Keyset (cursor) pagination of blog posts.
+
+Instead of counting all posts and skipping to an OFFSET, every page is fetched
+with a "WHERE (date, id) < cursor" condition on the (date, id) index, so deep
+pages of the archive cost the same as the first one. The cursor is the
+"<date>.<id>" of the post on the edge of the current page.
+"""
+import datetime
+
+from django.db.models import Q
+
+# Largest id of a page, larger ones don't fit in the database's integers
+MAX_ID = 2**31 - 1
+
+
+def get_cursor(blog):
+    return "{}.{}".format(blog.date.isoformat(), blog.pk)
+
+
+def parse_cursor(cursor):
+    """
+    (date, id) of a cursor, raises ValueError for invalid cursors
+    """
+    date, __, pk = cursor.partition(".")
+    date, pk = datetime.date.fromisoformat(date), int(pk)
+    if not 0 < pk <= MAX_ID:
+        raise ValueError("Invalid id in cursor: {}".format(pk))
+    return date, pk
+
+
+class CursorPage:
+    """
+    A page of posts with the same has_next/has_previous interface as Django's
+    paginator pages. "next" is older, "previous" is newer, like the posts are
+    ordered.
+    """
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return get_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return get_cursor(self.object_list[0])
+
+
+class CursorPaginator:
+    """
+    Paginates a queryset of BlogPage ordered by ("-date", "-pk")
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        """
+        The posts older than the cursor after, or newer than the cursor
+        before, or the newest posts if neither is given or there are no posts
+        on that side of the cursor.
+
+        Raises ValueError for invalid cursors
+        """
+        if before:
+            date, pk = parse_cursor(before)
+            newer = Q(date__gt=date) | Q(date=date, pk__gt=pk)
+            # Fetch in ascending order to get the posts right before the
+            # cursor, one more tells if there are even newer ones
+            blogs = list(self.queryset.filter(newer).reverse()[: self.per_page + 1])
+            if not blogs:
+                return self.page()
+            has_previous = len(blogs) > self.per_page
+            blogs = blogs[: self.per_page][::-1]
+            return CursorPage(blogs, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset
+        if after:
+            date, pk = parse_cursor(after)
+            queryset = queryset.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+        blogs = list(queryset[: self.per_page + 1])
+        if after and not blogs:
+            return self.page()
+        has_next = len(blogs) > self.per_page
+        return CursorPage(
+            blogs[: self.per_page], has_next=has_next, has_previous=bool(after)
+        )
@@ -0,0 +1,161 @@
+"""
+Related posts index of blog pages.
+
+Posts are related by the tags and categories they share, every shared tag or
+category counts one point. Only live posts in the same locale are related,
+ties are broken by the newest post. The best ones are stored as
+RelatedBlogPage rows, so a post view reads them with one indexed query.
+
+Posts that are published, unpublished or deleted are marked, together with
+the posts that list them. When the transaction commits, their indexes are
+updated, and then those of the new neighbours of the marked posts. Posts that
+they displaced elsewhere are picked up by running the update_related_posts
+management command.
+"""
+import threading
+from collections import Counter
+from collections import defaultdict
+
+from django.db import transaction
+
+from blog.models import BLOG_RELATED_POSTS
+from blog.models import BlogCategoryBlogPage
+from blog.models import BlogPage
+from blog.models import BlogPageTag
+from blog.models import RelatedBlogPage
+
+# Keep more than is shown, so there are still enough when some of them are
+# unpublished before the index is updated
+INDEX_SIZE = BLOG_RELATED_POSTS * 2
+
+_pending = threading.local()
+
+
+def get_terms(tags, categories):
+    """
+    {page id: {("tag", id), ("category", id)}} from querysets of BlogPageTag
+    and BlogCategoryBlogPage
+    """
+    terms = defaultdict(set)
+    for page_id, tag_id in tags.values_list("content_object_id", "tag_id"):
+        terms[page_id].add(("tag", tag_id))
+    for page_id, category_id in categories.values_list("page_id", "category_id"):
+        terms[page_id].add(("category", category_id))
+    return terms
+
+
+def rank_related(page_id, terms, pages_by_term, posts):
+    """
+    [(related page id, score)] of a page, best first
+
+    posts: {page id: (locale id, date)} of the live posts
+    """
+    locale_id = posts[page_id][0]
+    scores = Counter(
+        other_id
+        for term in terms[page_id]
+        for other_id in pages_by_term[term]
+        if other_id != page_id and posts.get(other_id, (None,))[0] == locale_id
+    )
+    return sorted(
+        scores.items(),
+        key=lambda item: (-item[1], -posts[item[0]][1].toordinal(), -item[0]),
+    )[:INDEX_SIZE]
+
+
+def update_related_posts(page_ids=None):
+    """
+    Rebuilds the related posts of the given pages, or of all posts if no ids
+    are given.
+
+    Returns {page id: [related page ids]}
+    """
+    live_tags = BlogPageTag.objects.filter(content_object__live=True)
+    live_categories = BlogCategoryBlogPage.objects.filter(page__live=True)
+    if page_ids is None:
+        terms = get_terms(live_tags, live_categories)
+        posts = BlogPage.objects.live()
+    else:
+        page_ids = list(page_ids)
+        terms = get_terms(
+            live_tags.filter(content_object_id__in=page_ids),
+            live_categories.filter(page_id__in=page_ids),
+        )
+        # Only the terms shared with the pages are needed to score them
+        shared = set().union(*terms.values())
+        tag_ids = {term_id for kind, term_id in shared if kind == "tag"}
+        category_ids = {term_id for kind, term_id in shared if kind == "category"}
+        for page_id, page_terms in get_terms(
+            live_tags.filter(tag_id__in=tag_ids),
+            live_categories.filter(category_id__in=category_ids),
+        ).items():
+            terms[page_id] |= page_terms
+        posts = BlogPage.objects.live().filter(pk__in=set(terms) | set(page_ids))
+
+    posts = {
+        pk: (locale_id, date)
+        for pk, locale_id, date in posts.values_list("pk", "locale_id", "date")
+    }
+    pages_by_term = defaultdict(set)
+    for page_id, page_terms in terms.items():
+        for term in page_terms:
+            pages_by_term[term].add(page_id)
+
+    rebuild = page_ids is None
+    if rebuild:
+        page_ids = list(posts)
+
+    related = {}
+    rows = []
+    for page_id in page_ids:
+        if page_id not in posts:
+            related[page_id] = []
+            continue
+        ranked = rank_related(page_id, terms, pages_by_term, posts)
+        related[page_id] = [related_id for related_id, __ in ranked]
+        rows += [
+            RelatedBlogPage(
+                page_id=page_id, related_id=related_id, score=score, rank=rank
+            )
+            for rank, (related_id, score) in enumerate(ranked)
+        ]
+
+    with transaction.atomic():
+        if rebuild:
+            RelatedBlogPage.objects.all().delete()
+        else:
+            RelatedBlogPage.objects.filter(page_id__in=page_ids).delete()
+        RelatedBlogPage.objects.bulk_create(rows)
+
+    return related
+
+
+def mark_posts(page_ids):
+    """
+    Updates the related posts of the given pages and of the posts that list
+    them when the current transaction commits, together with all other
+    marked posts.
+    """
+    page_ids = set(page_ids)
+    # Looked up now, the rows of a deleted post are gone on commit
+    neighbour_ids = set(
+        RelatedBlogPage.objects.filter(related_id__in=page_ids).values_list(
+            "page_id", flat=True
+        )
+    )
+    if not hasattr(_pending, "page_ids"):
+        _pending.page_ids = set()
+    _pending.page_ids |= page_ids | neighbour_ids
+    # The first callback to run takes all marked posts, the others find
+    # nothing left to do
+    transaction.on_commit(flush_posts)
+
+
+def flush_posts():
+    page_ids = _pending.__dict__.pop("page_ids", None)
+    if page_ids:
+        related = update_related_posts(page_ids)
+        # The new neighbours may now rank the posts differently
+        neighbour_ids = set().union(*related.values()) - page_ids
+        if neighbour_ids:
+            update_related_posts(neighbour_ids)
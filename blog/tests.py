@@ -0,0 +1,400 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpResponse
+from django.test import override_settings
+from django.test import RequestFactory
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+from wagtail.models import Site
+
+from blog.models import BlogCategory
+from blog.models import BlogCategoryBlogPage
+from blog.models import BlogCategoryCount
+from blog.models import BlogIndexPage
+from blog.models import BlogPage
+from blog.models import get_blog_sidebar
+from blog.pagination import CursorPaginator
+from blog.pagination import get_cursor
+from blog.pagination import parse_cursor
+from blog.views import cached_feed
+
+
+class ParseCursorTest(SimpleTestCase):
+    def test_cursor(self):
+        self.assertEqual(
+            parse_cursor("2020-02-29.12"), (datetime.date(2020, 2, 29), 12)
+        )
+
+    def test_malformed_cursors(self):
+        for cursor in [
+            "",
+            "12",
+            "2020-02-29",
+            "2020-02-29.",
+            "2020-02-30.12",
+            "29.02.2020.12",
+            "2020-02-29.abc",
+            "2020-02-29.1.2",
+            "2020-02-29.0",
+            "2020-02-29.-12",
+            # Too large for the database
+            "2020-02-29.99999999999999999999",
+        ]:
+            with self.subTest(cursor):
+                with self.assertRaises(ValueError):
+                    parse_cursor(cursor)
+
+
+class CursorPaginatorTest(TestCase):
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        self.index = home.add_child(
+            instance=BlogIndexPage(title="Blog", slug="test-blog")
+        )
+        # Three posts on the same day, so pages are split between them
+        for day, count in [(3, 1), (2, 3), (1, 1)]:
+            for __ in range(count):
+                self.index.add_child(
+                    instance=BlogPage(
+                        title="Post",
+                        slug="test-post-{}".format(BlogPage.objects.count()),
+                        date=datetime.date(2020, 1, day),
+                    )
+                )
+        self.blogs = self.index.blogs
+        self.paginator = CursorPaginator(self.blogs, 2)
+
+    def get_ids(self, page):
+        return [blog.pk for blog in page]
+
+    def get_pages(self):
+        """
+        All pages, from the newest posts to the oldest
+        """
+        page = self.paginator.page()
+        pages = [page]
+        while page.has_next():
+            page = self.paginator.page(after=page.next_cursor)
+            pages.append(page)
+        return pages
+
+    def test_first_page(self):
+        page = self.paginator.page()
+        self.assertEqual(self.get_ids(page), [blog.pk for blog in self.blogs[:2]])
+        self.assertFalse(page.has_previous())
+        self.assertIsNone(page.previous_cursor)
+        self.assertTrue(page.has_next())
+
+    def test_older_pages(self):
+        pages = self.get_pages()
+        self.assertEqual(
+            [self.get_ids(page) for page in pages],
+            [
+                [blog.pk for blog in self.blogs[:2]],
+                [blog.pk for blog in self.blogs[2:4]],
+                [blog.pk for blog in self.blogs[4:]],
+            ],
+        )
+        self.assertTrue(pages[-1].has_previous())
+        self.assertFalse(pages[-1].has_next())
+        self.assertIsNone(pages[-1].next_cursor)
+
+    def test_newer_pages(self):
+        pages = self.get_pages()
+        page = pages[-1]
+        newer = []
+        while page.has_previous():
+            page = self.paginator.page(before=page.previous_cursor)
+            newer.append(page)
+        self.assertEqual(
+            [self.get_ids(page) for page in newer],
+            [self.get_ids(page) for page in pages[-2::-1]],
+        )
+        self.assertFalse(newer[-1].has_previous())
+
+    def test_cursor_past_the_end(self):
+        self.assertEqual(
+            self.get_ids(self.paginator.page(after=get_cursor(self.blogs.last()))),
+            self.get_ids(self.paginator.page()),
+        )
+        self.assertEqual(
+            self.get_ids(self.paginator.page(before=get_cursor(self.blogs.first()))),
+            self.get_ids(self.paginator.page()),
+        )
+
+    def test_malformed_cursor(self):
+        with self.assertRaises(ValueError):
+            self.paginator.page(after="2020-01-02.abc")
+
+    @override_settings(BLOG_PAGINATION_CURSOR=True, BLOG_PAGINATION_PER_PAGE=2)
+    def test_page_numbers(self):
+        request = RequestFactory().get("/", {"page": 2})
+        page, older_url, newer_url = self.index.paginate(request, self.blogs)
+        self.assertEqual(self.get_ids(page), [blog.pk for blog in self.blogs[2:4]])
+        self.assertEqual((older_url, newer_url), ("?page=3", "?page=1"))
+
+    @override_settings(BLOG_PAGINATION_CURSOR=True, BLOG_PAGINATION_PER_PAGE=2)
+    def test_cursor_urls(self):
+        request = RequestFactory().get("/", {"after": "invalid"})
+        page, older_url, newer_url = self.index.paginate(request, self.blogs)
+        self.assertEqual(self.get_ids(page), [blog.pk for blog in self.blogs[:2]])
+        self.assertEqual(older_url, "?after=" + get_cursor(self.blogs[1]))
+        self.assertFalse(newer_url)
+
+
+class CachedFeedTest(TestCase):
+    def setUp(self):
+        self.rendered = []
+
+        def feed(request, **kwargs):
+            self.rendered.append(kwargs)
+            return HttpResponse("{}".format(kwargs), content_type="text/xml")
+
+        self.view = cached_feed(feed)
+
+    def get(self, query="", **kwargs):
+        return self.view(RequestFactory().get("/feed/" + query), **kwargs)
+
+    def test_query_string_is_not_cached(self):
+        for query in ["", "?a=1", "?a=2&b=3"]:
+            self.assertEqual(self.get(query, blog_slug="blog").status_code, 200)
+        self.assertEqual(self.rendered, [{"blog_slug": "blog"}])
+
+    def test_arguments_and_languages(self):
+        self.get(blog_slug="blog")
+        self.get(blog_slug="other")
+        with translation.override("de"):
+            self.get(blog_slug="blog")
+        self.get(blog_slug="blog")
+        self.assertEqual(len(self.rendered), 3)
+
+
+class BlogSidebarTest(TestCase):
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        self.index = home.add_child(
+            instance=BlogIndexPage(title="Blog", slug="test-blog")
+        )
+        self.user = get_user_model().objects.create_user(
+            "jane", first_name="Jane", last_name="Doe", password="secret"
+        )
+
+    def add_post(self):
+        return self.index.add_child(
+            instance=BlogPage(
+                title="Post",
+                slug="test-post-{}".format(BlogPage.objects.count()),
+                date=datetime.date(2020, 1, 1),
+                owner=self.user,
+            )
+        )
+
+    def test_authors(self):
+        locale = self.index.locale
+        self.assertEqual(get_blog_sidebar(locale)["authors"], [])
+        post = self.add_post()
+        # Cached until a post is published
+        self.assertEqual(get_blog_sidebar(locale)["authors"], [])
+        post.save_revision().publish()
+        self.assertEqual(
+            get_blog_sidebar(locale)["authors"],
+            [
+                {
+                    "pk": self.user.pk,
+                    "first_name": "Jane",
+                    "last_name": "Doe",
+                    "owned_pages__count": 1,
+                }
+            ],
+        )
+
+
+class RelatedPostsTest(TestCase):
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        self.index = home.add_child(
+            instance=BlogIndexPage(title="Blog", slug="test-blog")
+        )
+        self.categories = [
+            BlogCategory.objects.create(name=name, slug="test-" + name)
+            for name in ["a", "b"]
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts = [
+                self.add_post(day, categories)
+                for day, categories in [(1, [0, 1]), (2, [0, 1]), (3, [0]), (4, [])]
+            ]
+
+    def add_post(self, day, categories):
+        post = self.index.add_child(
+            instance=BlogPage(
+                title="Post",
+                slug="test-post-{}".format(day),
+                date=datetime.date(2020, 1, day),
+                categories=[
+                    BlogCategoryBlogPage(category=self.categories[index])
+                    for index in categories
+                ],
+            )
+        )
+        post.save_revision().publish()
+        return post
+
+    def get_related(self, post):
+        return [related.pk for related in post.get_related_posts()]
+
+    def test_ranking(self):
+        first, second, third, fourth = self.posts
+        # More shared categories first, then the newest
+        self.assertEqual(self.get_related(first), [second.pk, third.pk])
+        self.assertEqual(self.get_related(third), [second.pk, first.pk])
+        self.assertEqual(self.get_related(fourth), [])
+
+    def get_indexed(self, post):
+        return list(post.related_posts.values_list("related_id", flat=True))
+
+    def test_neighbours_updated(self):
+        first, second, third, __ = self.posts
+        with self.captureOnCommitCallbacks(execute=True):
+            second.unpublish()
+        self.assertEqual(self.get_indexed(first), [third.pk])
+        self.assertEqual(self.get_indexed(second), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            third.delete()
+        self.assertEqual(self.get_indexed(first), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            second.save_revision().publish()
+        self.assertEqual(self.get_indexed(first), [second.pk])
+
+
+class FeedTest(TestCase):
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        self.index = home.add_child(
+            instance=BlogIndexPage(title="Blog", slug="test-blog")
+        )
+        self.category = BlogCategory.objects.create(name="Cat", slug="test-cat")
+        with translation.override("en"):
+            self.url = reverse(
+                "blog:latest_entries_feed", kwargs={"blog_slug": "test-blog"}
+            )
+            self.category_url = reverse(
+                "blog:category_feed", kwargs={"category": "test-cat"}
+            )
+        self.add_post()
+
+    def add_post(self):
+        post = self.index.add_child(
+            instance=BlogPage(
+                title="Post",
+                slug="test-post-{}".format(BlogPage.objects.count()),
+                date=datetime.date(2020, 1, 1),
+                body_richtext='<p>Text<footnote id="{}">[1]</footnote></p>'.format(
+                    "1d3c4f4e-1111-4c5a-9a4a-6a4b2f0e1a01"
+                ),
+                categories=[BlogCategoryBlogPage(category=self.category)],
+            )
+        )
+        post.save_revision().publish()
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        for headers in [
+            {"HTTP_IF_NONE_MATCH": response["ETag"]},
+            {"HTTP_IF_MODIFIED_SINCE": response["Last-Modified"]},
+        ]:
+            with self.subTest(headers):
+                self.assertEqual(self.client.get(self.url, **headers).status_code, 304)
+
+    def test_publishing_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.add_post()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def assertQueriesPerFeed(self, url):
+        # Fills the caches that aren't per feed
+        self.client.get(url)
+        self.add_post()
+        queries = self.count_queries(url)
+        self.add_post()
+        self.add_post()
+        # Publishing renders the feed again
+        self.assertEqual(self.count_queries(url), queries)
+
+    def test_queries_per_post(self):
+        self.assertQueriesPerFeed(self.url)
+
+    def test_category_queries_per_post(self):
+        self.assertQueriesPerFeed(self.category_url)
+
+
+class CategoryCountsTest(TestCase):
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        self.index = home.add_child(
+            instance=BlogIndexPage(title="Blog", slug="test-blog")
+        )
+        self.parent = BlogCategory.objects.create(name="Parent", slug="test-parent")
+        self.child = BlogCategory.objects.create(
+            name="Child", slug="test-child", parent=self.parent
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts = [
+                self.add_post(day, categories)
+                for day, categories in [
+                    (1, [self.child]),
+                    (2, [self.parent, self.child]),
+                    (3, [self.parent]),
+                ]
+            ]
+
+    def add_post(self, day, categories):
+        return self.index.add_child(
+            instance=BlogPage(
+                title="Post",
+                slug="test-post-{}".format(day),
+                date=datetime.date(2020, 1, day),
+                categories=[
+                    BlogCategoryBlogPage(category=category) for category in categories
+                ],
+            )
+        )
+
+    def get_counts(self):
+        return {
+            category.slug: sum(count.post_count for count in category.counts.all())
+            for category in [self.parent, self.child]
+        }
+
+    def test_descendants_rolled_up(self):
+        # Posts of the child count for the parent, each post once
+        self.assertEqual(self.get_counts(), {"test-parent": 3, "test-child": 2})
+        self.assertEqual(
+            BlogCategoryCount.objects.get(category=self.parent).locale,
+            self.index.locale,
+        )
+
+    def test_unpublish_and_delete(self):
+        first, second, third = self.posts
+        with self.captureOnCommitCallbacks(execute=True):
+            first.unpublish()
+        self.assertEqual(self.get_counts(), {"test-parent": 2, "test-child": 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.get_counts(), {"test-parent": 1, "test-child": 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save_revision().publish()
+        self.assertEqual(self.get_counts(), {"test-parent": 2, "test-child": 1})
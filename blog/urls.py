@@ -9,7 +9,7 @@ urlpatterns = [
     re_path(r"^tag/(?P<tag>[-\w]+)/", views.tag_view, name="tag"),
     re_path(
         r"^category/(?P<category>[-\w]+)/feed/$",
-        views.LatestCategoryFeed(),
+        views.cached_feed(views.LatestCategoryFeed()),
         name="category_feed",
     ),
     re_path(r"^category/(?P<category>.+)/", views.category_view, name="category"),
@@ -17,12 +17,12 @@ urlpatterns = [
     re_path(r"^author/(?P<author>[-\w]+)/", views.author_view, name="author"),
     re_path(
         r"(?P<blog_slug>[\w-]+)/rss.*/",
-        views.LatestEntriesFeed(),
+        views.cached_feed(views.LatestEntriesFeed()),
         name="latest_entries_feed",
     ),
     re_path(
         r"(?P<blog_slug>[\w-]+)/atom.*/",
-        views.LatestEntriesFeedAtom(),
+        views.cached_feed(views.LatestEntriesFeedAtom()),
         name="latest_entries_feed_atom",
     ),
 ]
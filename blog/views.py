@@ -1,33 +1,109 @@
+import hashlib
+import time
+
 from django.conf import settings
 from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import Http404
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.cache import quote_etag
 from django.utils.feedgenerator import Atom1Feed
-from wagtail.models.i18n import Locale
+from django.utils.http import http_date
 
 from .models import BlogCategory
 from .models import BlogIndexPage
 from .models import BlogPage
+from .models import get_active_locale
+from .models import get_blog_generation
+from .models import get_blog_index
+from .models import get_locales
+from migcontrol.utils import replace_footnote_tags
+
+
+def serve_blog_index(request, **kwargs):
+    """
+    Serves the blog index of the language the request came in on
+    """
+    index = get_blog_index(get_active_locale())
+    if index is None:
+        raise Http404("No blog index")
+    return index.serve(request, **kwargs)
 
 
 def tag_view(request, tag):
-    index = BlogIndexPage.objects.first()
-    return index.serve(request, tag=tag)
+    return serve_blog_index(request, tag=tag)
 
 
 def category_view(request, category):
-    index = BlogIndexPage.objects.first()
-    return index.serve(request, category=category)
+    return serve_blog_index(request, category=category)
 
 
 def locale_view(request, locale):
-    index = BlogIndexPage.objects.first()
-    locale = Locale.objects.get(language_code=locale)
-    return index.serve(request, locale=locale)
+    locale = get_locales().get(locale)
+    if locale is None:
+        raise Http404("No such locale")
+    return serve_blog_index(request, locale=locale)
 
 
 def author_view(request, author):
-    index = BlogIndexPage.objects.first()
-    return index.serve(request, author=author)
+    return serve_blog_index(request, author=author)
+
+
+# Feeds are only rendered again when the blog changes, the timeout is to not
+# keep feeds that aren't requested anymore
+BLOG_FEED_CACHE_TIMEOUT = getattr(settings, "BLOG_FEED_CACHE_TIMEOUT", 60 * 60 * 24)
+FEED_CACHE_KEY = "blog-feed-{}-{}-{}-{}"
+
+
+def cached_feed(feed):
+    """
+    Wraps a Feed view so the feed is rendered once per change of the blog
+    (see get_blog_generation) and served with ETag and Last-Modified headers,
+    answering conditional requests with 304 Not Modified.
+
+    Feeds are cached per language and URL arguments, the query string isn't
+    part of the key so it can't be used to fill the cache.
+    """
+
+    def view(request, *args, **kwargs):
+        key = FEED_CACHE_KEY.format(
+            get_blog_generation(),
+            type(feed).__name__,
+            get_active_locale().language_code,
+            hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest(),
+        )
+        cached = cache.get(key)
+        if cached is None:
+            response = feed(request, *args, **kwargs)
+            cached = {
+                "content": response.content,
+                "content_type": response["Content-Type"],
+                "etag": quote_etag(hashlib.md5(response.content).hexdigest()),
+                "last_modified": int(time.time()),
+            }
+            cache.set(key, cached, BLOG_FEED_CACHE_TIMEOUT)
+
+        response = get_conditional_response(
+            request, etag=cached["etag"], last_modified=cached["last_modified"]
+        )
+        if response is None:
+            response = HttpResponse(
+                cached["content"], content_type=cached["content_type"]
+            )
+        response["ETag"] = cached["etag"]
+        response["Last-Modified"] = http_date(cached["last_modified"])
+        return response
+
+    return view
+
+
+def get_item_description(item):
+    """
+    The stored body of a blog page with its footnote references as links
+    """
+    return replace_footnote_tags(item.get_body(), item.get_footnote_numbers())
 
 
 class LatestEntriesFeed(Feed):
@@ -37,7 +113,13 @@ class LatestEntriesFeed(Feed):
     """
 
     def get_object(self, request, blog_slug):
-        return get_object_or_404(BlogIndexPage, slug=blog_slug)
+        # Translations of the blog index share the slug, prefer the one in
+        # the language of the request
+        indexes = BlogIndexPage.objects.live().filter(slug=blog_slug)
+        blog = indexes.filter(locale=get_active_locale()).first() or indexes.first()
+        if blog is None:
+            raise Http404("No blog index")
+        return blog
 
     def title(self, blog):
         if blog.seo_title:
@@ -52,13 +134,18 @@ class LatestEntriesFeed(Feed):
 
     def items(self, blog):
         num = getattr(settings, "BLOG_PAGINATION_PER_PAGE", 10)
-        return blog.get_descendants().order_by("-blogpage__date")[:num]
+        return (
+            BlogPage.objects.live()
+            .descendant_of(blog)
+            .prefetch_related("footnotes")
+            .order_by("-date", "-pk")[:num]
+        )
 
     def item_title(self, item):
         return item.title
 
     def item_description(self, item):
-        return item.specific.body_richtext
+        return get_item_description(item)
 
     def item_link(self, item):
         return item.full_url
@@ -84,10 +171,15 @@ class LatestCategoryFeed(Feed):
         return get_object_or_404(BlogCategory, slug=category)
 
     def items(self, obj):
-        return BlogPage.objects.filter(categories__category=obj).order_by("-date")[:5]
+        return (
+            BlogPage.objects.live()
+            .filter(categories__category=obj)
+            .prefetch_related("footnotes")
+            .order_by("-date", "-pk")[:5]
+        )
 
     def item_title(self, item):
         return item.title
 
     def item_description(self, item):
-        return item.body_legacy
+        return get_item_description(item)
@@ -0,0 +1,98 @@
+"""
+Stored bodies of pages that link to other pages or embed images.
+
+RenderedBodyMixin stores the expanded HTML of page bodies, which has the URLs
+of the linked pages and the renditions of the embedded images in it. When a
+linked page (or one of its translations) moves, changes its slug, is
+published, unpublished or deleted, or the renditions of an embedded image are
+deleted because its file was replaced, the pages referencing them are looked
+up in Wagtail's reference index. Their bodies are rendered again when the
+transaction commits, together with all other marked pages.
+
+The reference index is kept up to date by Wagtail when pages are saved, run
+Wagtail's rebuild_references_index management command to fill it for pages
+that haven't been saved since it was added.
+"""
+import threading
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.dispatch import Signal
+from wagtail.models import Page
+from wagtail.models import ReferenceIndex
+
+from home.models import RenderedBodyMixin
+
+_pending = threading.local()
+
+# Sent with the ids of the pages of a model whose stored bodies were rendered
+# again, for caches of content that includes them
+bodies_refreshed = Signal()
+
+
+def get_referencing_page_ids(model, object_ids):
+    """
+    ids of the pages that reference any of the given objects of model.
+    object_ids are ids as strings, like the reference index keeps them, or a
+    queryset of them.
+    """
+    return {
+        int(pk)
+        for pk in ReferenceIndex.objects.filter(
+            base_content_type=ContentType.objects.get_for_model(Page),
+            to_content_type=ContentType.objects.get_for_model(model),
+            to_object_id__in=object_ids,
+        ).values_list("object_id", flat=True)
+    }
+
+
+def refresh_bodies(page_ids):
+    """
+    Renders the stored bodies of the given pages again
+    """
+    refreshed = defaultdict(list)
+    for page in Page.objects.filter(pk__in=page_ids).specific():
+        if isinstance(page, RenderedBodyMixin):
+            page.store_body_html()
+            refreshed[type(page)].append(page.pk)
+    for model, ids in refreshed.items():
+        bodies_refreshed.send(sender=model, page_ids=ids)
+
+
+def mark_referencing_pages(model, object_ids):
+    """
+    Renders the stored bodies of the pages that reference any of the given
+    objects of model again when the current transaction commits, together
+    with all other marked pages.
+    """
+    page_ids = get_referencing_page_ids(model, object_ids)
+    if not page_ids:
+        return
+    if not hasattr(_pending, "page_ids"):
+        _pending.page_ids = set()
+    _pending.page_ids |= page_ids
+    # The first callback to run takes all marked pages, the others find
+    # nothing left to do
+    transaction.on_commit(flush_pages)
+
+
+def flush_pages():
+    page_ids = _pending.__dict__.pop("page_ids", None)
+    if page_ids:
+        refresh_bodies(page_ids)
+
+
+def mark_pages_linking_to(pages):
+    """
+    Marks the pages linking to any page of a queryset, or to one of their
+    translations, which the links resolve to in the language of the page
+    """
+    mark_referencing_pages(
+        Page,
+        Page.objects.filter(translation_key__in=pages.values("translation_key"))
+        .annotate(object_id=Cast("pk", CharField()))
+        .values("object_id"),
+    )
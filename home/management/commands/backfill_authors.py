@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from wagtail.models import get_page_models
+
+from home.models import AuthorsMixin
+
+
+class Command(BaseCommand):
+    """
+    Parses the authors field of all pages that have one into the Author and
+    PageAuthor tables.
+
+    Pages do this when they are saved, so this is needed for pages that
+    haven't been saved since.
+    """
+
+    def handle(self, *args, **options):
+        for model in get_page_models():
+            if not issubclass(model, AuthorsMixin):
+                continue
+            updated = 0
+            for page in model.objects.all().iterator():
+                page.refresh_page_authors()
+                updated += 1
+            print(
+                "Indexed authors of {} {}".format(
+                    updated, model._meta.verbose_name_plural
+                )
+            )
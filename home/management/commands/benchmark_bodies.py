@@ -0,0 +1,186 @@
+import itertools
+import json
+import platform
+import subprocess
+import timeit
+import uuid
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from wagtail.images import get_image_model
+from wagtail.models import Page
+from wagtail.rich_text import RichText
+from wagtail_footnotes.models import Footnote
+
+from blog.models import BlogPage
+from home.models import Article
+from home.templatetags.migcontrol_tags import richtext_footnotes
+from migcontrol import rich_text
+from migcontrol.utils import HEADER_LEVELS
+from wiki.models import WikiPage
+
+IMAGE_FORMATS = ["fullwidth", "left", "right"]
+
+
+class Command(BaseCommand):
+    """
+    Times the rendering of page bodies on synthetic BlogPage, WikiPage and
+    Article instances with an increasing number of sections. Every section
+    has a header, an internal link, a footnote and an inline image.
+
+    "rebuild" processes the body like saving a page does, which is also what
+    a preview or a page without a stored body costs on every request.
+    "stored" reads the body, TOC and footnote numbers of a page that has
+    stored them, which is what a published page costs. The results are
+    written as JSON so runs of different commits can be compared.
+
+    Links and images point at pages and images that exist in the database, so
+    run this against a database with some content.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10, 50, 200],
+            help="Numbers of sections to benchmark",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Take the best of this many runs",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark_bodies.json",
+            help="File to write the JSON results to",
+        )
+
+    def handle(self, *args, **options):
+        page_ids = list(Page.objects.filter(depth__gt=1).values_list("id", flat=True))
+        image_ids = list(get_image_model().objects.values_list("id", flat=True))
+
+        results = []
+        print(
+            "{:>10} {:>8} {:>20} {:>12} {:>8}".format(
+                "model", "sections", "operation", "best (ms)", "queries"
+            )
+        )
+        for model in [BlogPage, WikiPage, Article]:
+            for size in options["sizes"]:
+                source, footnotes = self.get_rich_text(size, page_ids, image_ids)
+                for operation, func in self.get_operations(model, source, footnotes):
+                    result = self.measure(func, options["repeat"])
+                    result.update(
+                        model=model.__name__, sections=size, operation=operation
+                    )
+                    results.append(result)
+                    print(
+                        "{model:>10} {sections:>8} {operation:>20} "
+                        "{best_ms:>12.3f} {queries:>8}".format(**result)
+                    )
+
+        with open(options["output"], "w") as f:
+            json.dump(
+                {
+                    "commit": self.get_commit(),
+                    "date": timezone.now().isoformat(),
+                    "python": platform.python_version(),
+                    "django": django.get_version(),
+                    "repeat": options["repeat"],
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print("Wrote {}".format(options["output"]))
+
+    def get_operations(self, model, source, footnotes):
+        """
+        [(name, callable)] to time for a page of the given model
+        """
+        page = self.get_page(model, source, footnotes)
+        stored = self.get_page(model, source, footnotes)
+        stored.refresh_body_html()
+        # The tag only gets the finished HTML
+        body = stored.get_body()
+
+        def read_stored():
+            return stored.get_body(), stored.get_toc(), stored.get_footnote_numbers()
+
+        return [
+            ("rebuild", page.refresh_body_html),
+            ("stored", read_stored),
+            ("richtext", lambda: rich_text.richtext(source)),
+            ("richtext_footnotes", lambda: richtext_footnotes({"page": page}, body)),
+        ]
+
+    def get_page(self, model, source, footnotes):
+        """
+        An unsaved page of the given model with source as its body
+        """
+        page = model(title="Benchmark", slug="benchmark")
+        if model is BlogPage:
+            page.body_richtext = source
+        elif model is WikiPage:
+            page.description = source
+        else:
+            page.body = [("paragraph", RichText(source))]
+        page.footnotes = footnotes
+        return page
+
+    def get_rich_text(self, size, page_ids, image_ids):
+        """
+        Rich text in database representation with size sections, and the
+        footnotes it references
+        """
+        levels = itertools.islice(itertools.cycle(HEADER_LEVELS), size)
+        footnotes = []
+        sections = []
+        for cnt, tag in enumerate(levels):
+            footnote = Footnote(uuid=str(uuid.uuid4()), text="<p>Note %d</p>" % cnt)
+            footnotes.append(footnote)
+            section = (
+                "<{tag}>Header {cnt}</{tag}>"
+                '<p>Some text with <a linktype="page" id="{page_id}">a link</a>'
+                '<footnote id="{footnote}">[{short}]</footnote>.</p>'
+            ).format(
+                tag=tag,
+                cnt=cnt,
+                page_id=page_ids[cnt % len(page_ids)] if page_ids else 0,
+                footnote=footnote.uuid,
+                short=footnote.uuid[:6],
+            )
+            if image_ids:
+                section += (
+                    '<embed embedtype="image" id="{}" format="{}" alt="" />'.format(
+                        image_ids[cnt % len(image_ids)], IMAGE_FORMATS[cnt % 3]
+                    )
+                )
+            sections.append(section)
+        return "".join(sections), footnotes
+
+    def measure(self, func, repeat):
+        """
+        Best time of repeat runs, and the number of queries of one run
+        """
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        return {"best_ms": best * 1000, "queries": len(queries)}
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
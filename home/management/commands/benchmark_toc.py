@@ -0,0 +1,53 @@
+import itertools
+import timeit
+
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+
+from migcontrol.utils import HEADER_LEVELS
+from migcontrol.utils import HEADER_TAGS
+from migcontrol.utils import toc
+
+
+class Command(BaseCommand):
+    """
+    Times migcontrol.utils.toc on synthetic bodies with an increasing number
+    of headers. The time per header should stay flat as the number of headers
+    grows.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000, 2500, 5000],
+            help="Numbers of headers to benchmark",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Take the best of this many runs",
+        )
+
+    def handle(self, *args, **options):
+        print("{:>8} {:>12} {:>14}".format("headers", "total (ms)", "per header (us)"))
+        for size in options["sizes"]:
+            headers = self.get_headers(size)
+            best = min(
+                timeit.repeat(lambda: toc(headers), number=1, repeat=options["repeat"])
+            )
+            print(
+                "{:>8} {:>12.3f} {:>14.3f}".format(
+                    size, best * 1000, best * 1000000 / size
+                )
+            )
+
+    def get_headers(self, size):
+        levels = itertools.islice(itertools.cycle(HEADER_LEVELS), size)
+        body = "".join(
+            "<{tag}>Header {cnt}</{tag}><p>Some text</p>".format(tag=tag, cnt=cnt)
+            for cnt, tag in enumerate(levels)
+        )
+        return BeautifulSoup(body, "html5lib").find_all(HEADER_TAGS)
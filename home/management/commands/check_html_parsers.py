@@ -0,0 +1,56 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from wagtail.models import get_page_models
+
+from home.models import RenderedBodyMixin
+from migcontrol.utils import HTML_PARSERS
+from migcontrol.utils import process_body
+
+header_id_re = re.compile(r'\bid="(header-[^"]*)"')
+
+
+class Command(BaseCommand):
+    """
+    Conformance check for MIGCONTROL_HTML_PARSER: processes the body of every
+    page with each of the supported parsers and compares the header anchors
+    and TOCs with what html5lib produces.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--parsers",
+            nargs="+",
+            choices=HTML_PARSERS,
+            default=HTML_PARSERS,
+            help="Parsers to compare with html5lib",
+        )
+
+    def handle(self, *args, **options):
+        parsers = [p for p in options["parsers"] if p != "html5lib"]
+        checked = 0
+        failures = 0
+        for model in get_page_models():
+            if not issubclass(model, RenderedBodyMixin):
+                continue
+            for page in model.objects.all().iterator():
+                body = page.render_body()
+                expected = self.get_anchors_and_toc(body, "html5lib")
+                for parser in parsers:
+                    if self.get_anchors_and_toc(body, parser) != expected:
+                        failures += 1
+                        print(
+                            "{} differs from html5lib: {} (id={})".format(
+                                parser, page.title, page.id
+                            )
+                        )
+                checked += 1
+
+        print("Checked {} pages with {}".format(checked, ", ".join(parsers)))
+        if failures:
+            raise CommandError("{} differences found".format(failures))
+
+    def get_anchors_and_toc(self, body, parser):
+        html, toc = process_body(body, parser=parser)
+        return header_id_re.findall(html), toc
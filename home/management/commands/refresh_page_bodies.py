@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from wagtail.models import get_page_models
+
+from home.models import RenderedBodyMixin
+
+
+class Command(BaseCommand):
+    """
+    Re-renders the stored body HTML, TOC and footnote numbers of all pages that keep one.
+
+    Pages render their body when they are saved, and again when pages they
+    link to or images they embed change (see home.bodies), so this is needed
+    for pages that haven't been saved since, or after changes made outside of
+    Wagtail.
+    """
+
+    def handle(self, *args, **options):
+        for model in get_page_models():
+            if not issubclass(model, RenderedBodyMixin):
+                continue
+            updated = 0
+            # The body is rendered in the language of each page's locale
+            for page in model.objects.select_related("locale").iterator():
+                page.store_body_html()
+                updated += 1
+            print("Refreshed {} {}".format(updated, model._meta.verbose_name_plural))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from wagtail.models import get_page_models
+
+from home.models import SortTitleMixin
+from migcontrol.utils import get_sort_key
+
+
+class Command(BaseCommand):
+    """
+    Computes the title sort keys of all pages that order their listings by
+    one.
+
+    Pages do this when they are saved, so this is needed for pages that
+    haven't been saved since, and after the sort key function changes.
+    """
+
+    def handle(self, *args, **options):
+        for model in get_page_models():
+            if not issubclass(model, SortTitleMixin):
+                continue
+            pages = []
+            for page in model.objects.only("id", "title", "title_sort").iterator():
+                title_sort = get_sort_key(page.title)[:255]
+                if page.title_sort != title_sort:
+                    page.title_sort = title_sort
+                    pages.append(page)
+            model.objects.bulk_update(pages, ["title_sort"], batch_size=500)
+            print(
+                "Updated title sort keys of {} {}".format(
+                    len(pages), model._meta.verbose_name_plural
+                )
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_article_toc'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='footnote_numbers',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+from migcontrol.utils import parse_authors
+
+# Pages with a free-text authors field
+PAGE_MODELS = [
+    "blog.BlogPage",
+    "library.BusinessPage",
+    "library.MediaPage",
+    "wiki.WikiPage",
+]
+
+
+def backfill_authors(apps, schema_editor):
+    Author = apps.get_model("home.Author")
+    PageAuthor = apps.get_model("home.PageAuthor")
+
+    # {page id: [author slugs]} and {slug: name} of the first spelling
+    page_slugs = {}
+    names = {}
+    for model in PAGE_MODELS:
+        for page_id, authors in apps.get_model(model).objects.values_list(
+            "pk", "authors"
+        ):
+            slugs = []
+            for name in parse_authors(authors):
+                slug = slugify(name, allow_unicode=True)
+                if slug and slug not in slugs:
+                    slugs.append(slug)
+                    names.setdefault(slug, name)
+            page_slugs[page_id] = slugs
+
+    existing = set(Author.objects.values_list("slug", flat=True))
+    Author.objects.bulk_create(
+        [
+            Author(name=name, slug=slug)
+            for slug, name in names.items()
+            if slug not in existing
+        ],
+        batch_size=500,
+    )
+    author_ids = dict(Author.objects.values_list("slug", "pk"))
+
+    # All rows are of the pages above, and written again
+    PageAuthor.objects.all().delete()
+    PageAuthor.objects.bulk_create(
+        [
+            PageAuthor(
+                page_id=page_id, author_id=author_ids[slug], sort_order=sort_order
+            )
+            for page_id, slugs in page_slugs.items()
+            for sort_order, slug in enumerate(slugs)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0015_author"),
+        ("blog", "0022_category_counts"),
+        ("library", "0010_title_sort"),
+        ("wiki", "0009_wikipage_title_sort"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_authors, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,9 @@
-from bs4 import BeautifulSoup
 from django.db import models  # noqa
+from django.db.models.signals import post_delete
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import translation
+from django.utils.functional import cached_property
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from modelcluster.fields import ParentalKey
@@ -8,9 +12,14 @@ from wagtail import blocks
 from wagtail.admin.panels import FieldPanel
 from wagtail.admin.panels import InlinePanel
 from wagtail.fields import StreamField
+from wagtail.images import get_image_model
 from wagtail.images.blocks import ImageChooserBlock
 from wagtail.models import Orderable
 from wagtail.models import Page
+from wagtail.signals import page_published
+from wagtail.signals import page_slug_changed
+from wagtail.signals import page_unpublished
+from wagtail.signals import post_page_move
 from wagtail.snippets.models import register_snippet
 
 from home.fields import CarouselBlog
@@ -19,7 +28,10 @@ from home.fields import CarouselRaw
 from home.fields import FeatureBlock
 from home.fields import OrganizationsCardBlock
 from home.fields import SectionCardBlock
-from migcontrol.utils import get_toc
+from migcontrol.utils import get_sort_key
+from migcontrol.utils import number_footnotes
+from migcontrol.utils import parse_authors
+from migcontrol.utils import process_body
 
 
 class HomePage(Page):
@@ -67,7 +79,267 @@ class HomePage(Page):
     ]
 
 
-class ArticleBase(models.Model):
+class RenderedBodyMixin(models.Model):
+    """
+    Keeps the processed (anchor-annotated) HTML of a page body, its TOC and
+    the numbering of its footnotes next to the page. They are rendered when
+    the page is saved, which is also what happens when a revision is
+    published, so views can read the stored copies instead of parsing the
+    body on every request. Pages linking to pages or embedding images that
+    change are rendered again, see home.bodies.
+
+    Page models using this mixin implement render_body() to return the raw
+    HTML of their body.
+    """
+
+    body_html = models.TextField(blank=True, editable=False)
+    # TOC of body_html, [[name, [*children]]]
+    toc = models.JSONField(default=list, blank=True, editable=False)
+    # {footnote uuid: number} in order of the references in body_html
+    footnote_numbers = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def render_body(self):
+        raise NotImplementedError
+
+    def get_processed_body(self):
+        """
+        (body html, [(name, [*children])], {footnote uuid: number}) - the body
+        is only processed once per instance, no matter how many times the
+        template asks for it.
+        """
+        if not hasattr(self, "_processed_body"):
+            # Links to pages are resolved to their translations in the active
+            # language, which has to be the page's, not the editor's
+            locale = self.locale if self.locale_id else self.get_default_locale()
+            with translation.override(locale.language_code):
+                body, toc = process_body(self.render_body())
+            self._processed_body = (
+                body,
+                toc,
+                number_footnotes(body, self.footnotes_by_id),
+            )
+        return self._processed_body
+
+    def refresh_body_html(self):
+        self.__dict__.pop("_processed_body", None)
+        self.__dict__.pop("footnotes_by_id", None)
+        self.__dict__.pop("footnotes_list", None)
+        self.body_html, self.toc, self.footnote_numbers = self.get_processed_body()
+
+    def store_body_html(self):
+        """
+        Renders the body again and stores it with update(), which doesn't
+        create a revision or log entry
+        """
+        self.refresh_body_html()
+        type(self).objects.filter(pk=self.pk).update(
+            body_html=self.body_html,
+            toc=self.toc,
+            footnote_numbers=self.footnote_numbers,
+        )
+
+    # body_html and toc are empty for pages that haven't been saved since they
+    # were added. Run refresh_page_bodies to fill them in.
+
+    def get_body(self):
+        if self.body_html:
+            return self.body_html
+        return self.get_processed_body()[0]
+
+    def get_toc(self):
+        """
+        [(name, [*children])]
+        """
+        if self.body_html:
+            return self.toc
+        return self.get_processed_body()[1]
+
+    @cached_property
+    def footnotes_by_id(self):
+        """
+        {footnote uuid: footnote} - the footnotes of the instance, which for
+        revisions and previews aren't the ones in the database yet
+        """
+        return {str(footnote.uuid): footnote for footnote in self.footnotes.all()}
+
+    def get_footnote_numbers(self):
+        """
+        {footnote uuid: number}
+        """
+        if not self.body_html:
+            return self.get_processed_body()[2]
+        if self.footnote_numbers.keys() == self.footnotes_by_id.keys():
+            return self.footnote_numbers
+        # Footnotes were added or deleted without saving the page, the page
+        # was stored before its footnotes were numbered, or some footnotes
+        # aren't referenced. Number them from the stored body instead.
+        return number_footnotes(self.body_html, self.footnotes_by_id)
+
+    @cached_property
+    def footnotes_list(self):
+        """
+        The referenced footnotes in the order of their numbers, used by the
+        wagtail_footnotes/includes/footnotes.html template
+        """
+        numbers = self.get_footnote_numbers()
+        footnotes = [
+            footnote
+            for footnote_id, footnote in self.footnotes_by_id.items()
+            if footnote_id in numbers
+        ]
+        return sorted(footnotes, key=lambda footnote: numbers[str(footnote.uuid)])
+
+    def save(self, *args, **kwargs):
+        # Partial saves (i.e. save_revision updating latest_revision) don't
+        # change the live body
+        if kwargs.get("update_fields") is None:
+            self.refresh_body_html()
+        return super().save(*args, **kwargs)
+
+    def serve_preview(self, request, mode_name):
+        # Previews are built from unsaved revisions, so the stored body is not
+        # the one we want to see
+        self.refresh_body_html()
+        return super().serve_preview(request, mode_name)
+
+
+@receiver(post_page_move)
+def page_moved(sender, instance, url_path_before, url_path_after, **kwargs):
+    from home.bodies import mark_pages_linking_to
+
+    # Reordering pages under the same parent doesn't change their URLs
+    if url_path_before != url_path_after:
+        mark_pages_linking_to(instance.get_descendants(inclusive=True))
+
+
+@receiver(page_slug_changed)
+def page_renamed(sender, instance, **kwargs):
+    from home.bodies import mark_pages_linking_to
+
+    mark_pages_linking_to(instance.get_descendants(inclusive=True))
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(pre_delete, sender=Page)
+def page_live_changed(sender, instance, **kwargs):
+    from home.bodies import mark_pages_linking_to
+
+    # Links resolve to the live translation in the language of the page
+    mark_pages_linking_to(Page.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender="images.CustomRendition")
+def rendition_deleted(sender, instance, **kwargs):
+    from home.bodies import mark_referencing_pages
+
+    # Renditions are deleted when the file of an image is replaced
+    mark_referencing_pages(get_image_model(), [str(instance.image_id)])
+
+
+class Author(models.Model):
+    """
+    Authors parsed from the free-text authors field of pages, so pages can be
+    looked up by author. Names that slugify the same are the same author.
+    """
+
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=255, unique=True, allow_unicode=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def get_for_names(cls, names):
+        """
+        [Author] for a list of names, creating the missing ones
+        """
+        slugs = {}
+        for name in names:
+            slug = slugify(name, allow_unicode=True)
+            if slug:
+                slugs.setdefault(slug, name)
+        authors = cls.objects.in_bulk(list(slugs), field_name="slug")
+        missing = [
+            cls(name=name, slug=slug)
+            for slug, name in slugs.items()
+            if slug not in authors
+        ]
+        if missing:
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+            authors = cls.objects.in_bulk(list(slugs), field_name="slug")
+        return [authors[slug] for slug in slugs]
+
+
+class PageAuthor(models.Model):
+    page = models.ForeignKey(
+        Page, on_delete=models.CASCADE, related_name="page_authors"
+    )
+    author = models.ForeignKey(
+        Author, on_delete=models.CASCADE, related_name="page_authors"
+    )
+    sort_order = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["sort_order"]
+        unique_together = [("page", "author")]
+
+
+class AuthorsMixin(models.Model):
+    """
+    Keeps the PageAuthor rows of a page with an "authors" text field in sync
+    when the page is saved, which is also what happens when a revision is
+    published. Run backfill_authors for pages that haven't been saved since.
+    """
+
+    class Meta:
+        abstract = True
+
+    def refresh_page_authors(self):
+        authors = Author.get_for_names(parse_authors(self.authors))
+        PageAuthor.objects.filter(page=self).delete()
+        PageAuthor.objects.bulk_create(
+            PageAuthor(page=self, author=author, sort_order=sort_order)
+            for sort_order, author in enumerate(authors)
+        )
+
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        if kwargs.get("update_fields") is None:
+            self.refresh_page_authors()
+        return result
+
+
+class SortTitleMixin(models.Model):
+    """
+    Keeps an indexed sort key of the page title, so alphabetical listings are
+    ordered by "title_sort" instead of a database collation. The key is
+    computed when the page is saved, run refresh_sort_titles for pages that
+    haven't been saved since.
+    """
+
+    title_sort = models.CharField(
+        max_length=255, blank=True, editable=False, db_index=True
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.title_sort = get_sort_key(self.title)[:255]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "title" in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["title_sort"]
+        return super().save(*args, **kwargs)
+
+
+class ArticleBase(RenderedBodyMixin):
     """
     This mixin can be reused in Page models of other applications that need
     the same structure.
@@ -99,28 +371,12 @@ class ArticleBase(models.Model):
         abstract = True
 
     def get_toc(self):
-        """
-        [(name, [*children])]
-        """
-        return get_toc(self.get_body())
-
-    def get_body(self):
-        body = "".join([str(f.value) for f in self.body])
-
-        # Now let's add some id=... attributes to all h{1,2,3,4,5}
-        soup = BeautifulSoup(body, "html5lib")
-
-        # Beautiful soup unfortunately adds some noise to the structure, so we
-        # remove this again - see:
-        # https://stackoverflow.com/questions/21452823/beautifulsoup-how-should-i-obtain-the-body-contents
-        for attr in ["head", "html", "body"]:
-            if hasattr(soup, attr):
-                getattr(soup, attr).unwrap()
-
-        for element in soup.find_all(["h1", "h2", "h3", "h4", "h5"]):
-            element["id"] = "header-" + slugify(element.text, allow_unicode=True)
+        if self.hide_toc:
+            return []
+        return super().get_toc()
 
-        return str(soup)
+    def render_body(self):
+        return "".join([str(f.value) for f in self.body])
 
 
 class Article(ArticleBase, Page):
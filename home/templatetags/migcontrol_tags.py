@@ -1,8 +1,5 @@
-import re
-
 from django import template
 from django.contrib.staticfiles import finders
-from django.core.exceptions import ValidationError
 from django.core.files.storage import FileSystemStorage
 from django.utils import translation
 from django.utils.safestring import mark_safe
@@ -12,6 +9,10 @@ from wagtail.models import Page
 from wagtail.models import Site
 from wagtail.templatetags.wagtailcore_tags import pageurl
 
+from home.models import RenderedBodyMixin
+from migcontrol import rich_text
+from migcontrol.utils import replace_footnote_tags
+
 
 register = template.Library()
 
@@ -100,37 +101,17 @@ def get_page_by_slug(parent, slug):
 @register.simple_tag(takes_context=True)
 def richtext_footnotes(context, html):
     """
-    example: {% richtext_footnotes page.body|richtext %}
+    example: {% richtext_footnotes page.get_body %}
 
-    html: already processed richtext field html
-    Assumes "page" in context.
+    html: already processed body html of the page
+    Assumes "page" in context. Footnotes are numbered when the page is saved,
+    see RenderedBodyMixin.
     """
-    FIND_FOOTNOTE_TAG = re.compile(r'<footnote id="(.*?)">.*?</footnote>')
-
-    if not isinstance(context.get("page"), Page):
+    page = context.get("page")
+    if not isinstance(page, RenderedBodyMixin):
         return html
 
-    page = context["page"]
-    if not hasattr(page, "footnotes_list"):
-        page.footnotes_list = []
-    footnotes = {str(footnote.uuid): footnote for footnote in page.footnotes.all()}
-
-    def replace_tag(match):
-        try:
-            index = process_footnote(match.group(1), page)
-        except (KeyError, ValidationError):
-            return ""
-        else:
-            return f'<a href="#footnote-{index}" id="footnote-source-{index}"><sup>[{index}]</sup></a>'
-
-    def process_footnote(footnote_id, page):
-        footnote = footnotes[footnote_id]
-        if footnote not in page.footnotes_list:
-            page.footnotes_list.append(footnote)
-        # Add 1 to the index as footnotes are indexed starting at 1 not 0.
-        return page.footnotes_list.index(footnote) + 1
-
-    return mark_safe(FIND_FOOTNOTE_TAG.sub(replace_tag, html))
+    return mark_safe(replace_footnote_tags(html, page.get_footnote_numbers()))
 
 
 # Retrieves the top menu items - the immediate children of the parent page
@@ -183,6 +164,17 @@ def migcontrol_relative_url_path(url_path, locale_id):
     return "/".join(url_parts)
 
 
+@register.filter()
+def richtext_bulk(value):
+    """
+    {{ page.about|richtext_bulk }}
+
+    Same as Wagtail's richtext filter, but loads all linked pages, documents
+    and images of the value in bulk.
+    """
+    return rich_text.richtext(value)
+
+
 @register.filter()
 def slugify_unicode(words):
     return slugify(words, allow_unicode=True)
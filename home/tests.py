@@ -0,0 +1,161 @@
+from django.test import TestCase
+from django.utils import translation
+from wagtail.images import get_image_model
+from wagtail.images.tests.utils import get_test_image_file
+from wagtail.models import Locale
+from wagtail.models import Page
+from wagtail.models import ReferenceIndex
+from wagtail.models import Site
+from wagtail_footnotes.models import Footnote
+
+from wiki.models import WikiPage
+
+
+class RenderedBodyTest(TestCase):
+    def setUp(self):
+        self.de, __ = Locale.objects.get_or_create(language_code="de")
+        self.home = Site.objects.get(is_default_site=True).root_page
+        self.target = self.home.add_child(
+            instance=Page(title="Target", slug="test-target")
+        )
+        self.target_de = self.target.copy_for_translation(self.de, copy_parents=True)
+        self.target_de.save_revision().publish()
+        self.target_de.refresh_from_db()
+
+    def get_link(self, page):
+        with translation.override(page.locale.language_code):
+            return 'href="{}"'.format(page.url)
+
+    def add_wiki_page(self, description, **kwargs):
+        return self.home.add_child(
+            instance=WikiPage(
+                title="Wiki", slug="test-wiki", description=description, **kwargs
+            )
+        )
+
+    def test_translation_links_to_translated_pages(self):
+        wiki = self.add_wiki_page(
+            '<p><a linktype="page" id="{}">Target</a></p>'.format(self.target.pk)
+        )
+        wiki_de = wiki.copy_for_translation(self.de)
+
+        # Saved from an admin UI that is in English
+        with translation.override("en"):
+            wiki_de.save()
+
+        self.assertIn(self.get_link(self.target_de), wiki_de.body_html)
+        self.assertNotIn(self.get_link(self.target), wiki_de.body_html)
+        # The original still links to the English page
+        self.assertIn(self.get_link(self.target), wiki.body_html)
+
+
+class FootnoteNumbersTest(TestCase):
+    ids = [
+        "1d3c4f4e-1111-4c5a-9a4a-6a4b2f0e1a01",
+        "1d3c4f4e-2222-4c5a-9a4a-6a4b2f0e1a02",
+        "1d3c4f4e-3333-4c5a-9a4a-6a4b2f0e1a03",
+    ]
+
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        # References the footnotes in reverse order, the last one twice
+        self.page = home.add_child(
+            instance=WikiPage(
+                title="Footnotes",
+                slug="test-footnotes",
+                description="".join(
+                    '<p>Text<footnote id="{0}">[{0}]</footnote></p>'.format(id)
+                    for id in reversed(self.ids + self.ids[-1:])
+                ),
+                footnotes=[
+                    Footnote(uuid=id, text="<p>{}</p>".format(id))
+                    for id in self.ids[1:]
+                ],
+            )
+        )
+
+    def get_page(self):
+        return WikiPage.objects.get(pk=self.page.pk)
+
+    def test_stored_numbers(self):
+        self.assertEqual(self.page.footnote_numbers, {self.ids[2]: 1, self.ids[1]: 2})
+        page = self.get_page()
+        self.assertEqual(page.get_footnote_numbers(), page.footnote_numbers)
+        self.assertEqual(
+            [str(footnote.uuid) for footnote in page.footnotes_list],
+            [self.ids[2], self.ids[1]],
+        )
+
+    def test_footnote_added_without_saving(self):
+        Footnote.objects.create(page=self.page, uuid=self.ids[0], text="<p>New</p>")
+        page = self.get_page()
+        self.assertEqual(
+            page.get_footnote_numbers(),
+            {self.ids[2]: 1, self.ids[1]: 2, self.ids[0]: 3},
+        )
+        self.assertEqual(
+            [str(footnote.uuid) for footnote in page.footnotes_list],
+            [self.ids[2], self.ids[1], self.ids[0]],
+        )
+
+    def test_footnote_deleted_without_saving(self):
+        Footnote.objects.filter(uuid=self.ids[2]).delete()
+        self.assertEqual(self.get_page().get_footnote_numbers(), {self.ids[1]: 1})
+
+    def test_numbers_not_stored(self):
+        WikiPage.objects.filter(pk=self.page.pk).update(footnote_numbers={})
+        self.assertEqual(
+            self.get_page().get_footnote_numbers(),
+            {self.ids[2]: 1, self.ids[1]: 2},
+        )
+
+
+class ReferencedChangesTest(TestCase):
+    def setUp(self):
+        self.home = Site.objects.get(is_default_site=True).root_page
+        self.target = self.home.add_child(
+            instance=Page(title="Target", slug="test-target")
+        )
+        self.image = get_image_model().objects.create(
+            title="Image", file=get_test_image_file()
+        )
+        self.wiki = self.home.add_child(
+            instance=WikiPage(
+                title="Wiki",
+                slug="test-wiki",
+                description=(
+                    '<p><a linktype="page" id="{}">Target</a></p>'
+                    '<embed embedtype="image" id="{}" format="fullwidth" alt=""/>'
+                ).format(self.target.pk, self.image.pk),
+            )
+        )
+        # Wagtail updates the index on commit in the admin
+        ReferenceIndex.create_or_update_for_object(self.wiki)
+
+    def get_body(self):
+        # What the template renders
+        return WikiPage.objects.get(pk=self.wiki.pk).get_body()
+
+    def assertLinksTo(self, url):
+        self.assertIn('href="{}"'.format(url), self.get_body())
+
+    def test_linked_page_moved(self):
+        parent = self.home.add_child(instance=Page(title="Parent", slug="test-parent"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.target.move(parent, pos="last-child")
+        self.assertLinksTo("/en/test-parent/test-target/")
+
+    def test_parent_of_linked_page_renamed(self):
+        parent = self.home.add_child(instance=Page(title="Parent", slug="test-parent"))
+        self.target.move(parent, pos="last-child")
+        parent.slug = "test-renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            parent.save_revision().publish()
+        self.assertLinksTo("/en/test-renamed/test-target/")
+
+    def test_image_file_replaced(self):
+        rendition = self.image.renditions.get()
+        self.assertIn(rendition.url, self.get_body())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.image.renditions.all().delete()
+        self.assertIn(self.image.renditions.get().url, self.get_body())
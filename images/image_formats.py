@@ -1,7 +1,9 @@
 from django.utils.html import escape
+from wagtail.images import get_image_model
 from wagtail.images.formats import Format
 from wagtail.images.formats import register_image_format
 from wagtail.images.formats import unregister_image_format
+from wagtail.images.models import Filter
 
 
 class CaptionedImageFormat(Format):
@@ -13,26 +15,77 @@ class CaptionedImageFormat(Format):
 
     def image_to_html(self, image, alt_text, extra_attributes=""):
         rendition = image.get_rendition(self.filter_spec)
+        return self.rendition_to_html(image, rendition, alt_text, extra_attributes)
 
+    def rendition_to_html(self, image, rendition, alt_text, extra_attributes=""):
         if self.classnames:
             class_attr = 'class="%s" ' % escape(self.classnames)
         else:
             class_attr = ""
 
         return """<figure %s%s>
-            <img src="%s" alt="%s" />
+            <img src="%s" width="%d" height="%d" alt="%s" />
             <figcaption class="a4">%s</figcaption>
         </figure>""" % (
             extra_attributes,
             class_attr,
             escape(rendition.url),
-            # rendition.width,
-            # rendition.height,
+            rendition.width,
+            rendition.height,
             alt_text,
             image.caption,
         )
 
 
+def get_renditions(images_and_filter_specs):
+    """
+    Takes a list of (image, filter_spec) and returns
+    {(image.id, filter_spec): rendition}
+
+    All existing renditions are fetched in one query and the missing ones are
+    generated and inserted together, rather than image.get_rendition() doing
+    both for every single image.
+    """
+    Rendition = get_image_model().get_rendition_model()
+
+    filters = {spec: Filter(spec=spec) for __, spec in images_and_filter_specs}
+    wanted = {
+        (image.id, spec, filters[spec].get_cache_key(image)): image
+        for image, spec in images_and_filter_specs
+    }
+    if not wanted:
+        return {}
+
+    def fetch(image_ids):
+        return {
+            (r.image_id, r.filter_spec, r.focal_point_key): r
+            for r in Rendition.objects.filter(
+                image_id__in=image_ids, filter_spec__in=list(filters)
+            )
+        }
+
+    renditions = fetch({key[0] for key in wanted})
+
+    missing = [key for key in wanted if key not in renditions]
+    if missing:
+        Rendition.objects.bulk_create(
+            [
+                Rendition(
+                    image=wanted[key],
+                    filter_spec=key[1],
+                    focal_point_key=key[2],
+                    file=wanted[key].generate_rendition_file(filters[key[1]]),
+                )
+                for key in missing
+            ],
+            # Another request may have created some of them in the meantime
+            ignore_conflicts=True,
+        )
+        renditions.update(fetch({key[0] for key in missing}))
+
+    return {(key[0], key[1]): renditions[key] for key in wanted if key in renditions}
+
+
 unregister_image_format("fullwidth")
 unregister_image_format("left")
 unregister_image_format("right")
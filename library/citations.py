@@ -0,0 +1,207 @@
+"""
+BibTeX and RIS citations of media pages.
+
+Citations of single media pages are rendered on request. The citations of the
+whole library are written to a file per format in the default storage when
+the transactions that publish, unpublish or delete media pages commit, once
+per transaction. They are downloaded as static files instead of being
+rendered, or scraped from the library listing. Run the generate_citations
+management command to write them the first time.
+"""
+import os
+import re
+import tempfile
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import slugify
+
+from .export import EXPORT_CHUNK_SIZE
+from .models import MediaPage
+from migcontrol.utils import parse_authors
+
+_pending = threading.local()
+
+# (BibTeX entry type, RIS reference type) of the media types
+CITATION_TYPES = {
+    "PDF": ("misc", "GEN"),
+    "Article": ("article", "JOUR"),
+    "Website": ("misc", "ELEC"),
+    "Report / PDF": ("techreport", "RPRT"),
+    "Essay": ("misc", "GEN"),
+    "Broshure / PDF": ("booklet", "PAMP"),
+    "Website and Report": ("techreport", "RPRT"),
+    "Book / PDF": ("book", "BOOK"),
+    "Book": ("book", "BOOK"),
+    "Book, PDF": ("misc", "BLOG"),
+    "Policy Document": ("techreport", "GOVDOC"),
+}
+
+# Fields of the publisher per BibTeX entry type, the default is "publisher"
+BIBTEX_PUBLISHER_FIELDS = {
+    "article": "journal",
+    "techreport": "institution",
+    "misc": "howpublished",
+}
+
+BIBTEX_SPECIAL = re.compile(r"[\\{}&%$#_^~]")
+
+BIBTEX_REPLACEMENTS = {
+    "\\": r"\textbackslash{}",
+    "^": r"\textasciicircum{}",
+    "~": r"\textasciitilde{}",
+}
+
+
+def get_citation_type(page):
+    return CITATION_TYPES.get(page.media_type, ("misc", "GEN"))
+
+
+def get_url(page):
+    return page.link or page.full_url
+
+
+def escape_bibtex(value):
+    return BIBTEX_SPECIAL.sub(
+        lambda match: BIBTEX_REPLACEMENTS.get(match.group(), "\\" + match.group()),
+        str(value),
+    )
+
+
+def get_bibtex_key(page, authors):
+    """
+    "<first author's last name><year>-<id>", i.e. "doe2020-123"
+    """
+    surname = slugify(authors[0].split()[-1]).replace("-", "") if authors else ""
+    return "{}{}-{}".format(surname or "anon", page.year or "nd", page.pk)
+
+
+def to_bibtex(page):
+    authors = parse_authors(page.authors)
+    entry_type = get_citation_type(page)[0]
+    fields = [
+        ("author", " and ".join(escape_bibtex(author) for author in authors)),
+        # Double braces keep the capitalization of the title
+        ("title", "{%s}" % escape_bibtex(page.full_title or page.title)),
+        (
+            BIBTEX_PUBLISHER_FIELDS.get(entry_type, "publisher"),
+            escape_bibtex(page.publisher or ""),
+        ),
+        ("year", page.year or ""),
+        ("url", escape_bibtex(get_url(page))),
+    ]
+    return "@{}{{{},\n{}\n}}\n\n".format(
+        entry_type,
+        get_bibtex_key(page, authors),
+        ",\n".join(
+            "  {} = {{{}}}".format(name, value) for name, value in fields if value
+        ),
+    )
+
+
+def to_ris(page):
+    ris_type = get_citation_type(page)[1]
+    lines = [("TY", ris_type)]
+    lines += [("AU", author) for author in parse_authors(page.authors)]
+    lines += [
+        ("TI", page.full_title or page.title),
+        ("JO" if ris_type == "JOUR" else "PB", page.publisher),
+        ("PY", page.year),
+        ("UR", get_url(page)),
+        ("LA", page.locale.language_code),
+        ("ER", ""),
+    ]
+    # Every tag is one line, line breaks in the fields would end it
+    return "".join(
+        "{}  - {}\r\n".format(tag, " ".join(str(value).split()))
+        for tag, value in lines
+        if value or tag == "ER"
+    )
+
+
+# {format: (render, content type)}
+FORMATS = {
+    "bib": (to_bibtex, "application/x-bibtex; charset=utf-8"),
+    "ris": (to_ris, "application/x-research-info-systems; charset=utf-8"),
+}
+
+
+def get_citations_file_name(format):
+    return "library/citations/library.{}".format(format)
+
+
+def get_citations_file_urls():
+    """
+    {format: URL of the citations of the whole library}
+    """
+    return {
+        format: default_storage.url(get_citations_file_name(format))
+        for format in FORMATS
+    }
+
+
+def write_citations_files():
+    """
+    Writes the citations of all live media pages, one file per format. The
+    pages are read in chunks and written to a temporary file first, so the
+    memory used doesn't grow with the library.
+    """
+    for format, (render, __) in FORMATS.items():
+        pages = (
+            MediaPage.objects.live()
+            .select_related("locale")
+            .order_by("title_sort", "id")
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        with tempfile.TemporaryFile() as f:
+            for page in pages:
+                f.write(render(page).encode())
+            f.seek(0)
+            replace_file(get_citations_file_name(format), File(f))
+
+
+def replace_file(name, content):
+    """
+    Saves content under name in the default storage, replacing the file that
+    is there. The old file is served until the new one is complete.
+    """
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        path = None
+
+    if path is not None:
+        # The file system storage would save it under another name, so it's
+        # saved next to the old file and moved over it
+        os.replace(default_storage.path(default_storage.save(name, content)), path)
+        return
+
+    # Storages without local files, i.e. object stores, have to be set to
+    # overwrite files
+    saved = default_storage.save(name, content)
+    if saved != name:
+        default_storage.delete(saved)
+        raise ImproperlyConfigured(
+            "The default storage saved {} as {}, it has to overwrite files".format(
+                name, saved
+            )
+        )
+
+
+def mark_citations_files():
+    """
+    Writes the citations files again when the current transaction commits,
+    once no matter how many media pages changed in it
+    """
+    _pending.citations_files = True
+    # The first callback to run writes the files, the others find nothing
+    # left to do
+    transaction.on_commit(flush_citations_files)
+
+
+def flush_citations_files():
+    if _pending.__dict__.pop("citations_files", False):
+        write_citations_files()
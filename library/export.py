@@ -0,0 +1,168 @@
+"""
+Streaming exports of the library and the business directory.
+
+Pages are read in chunks of LIBRARY_EXPORT_CHUNK_SIZE, with their regions,
+topics, industries and sources prefetched once per chunk, and every row is
+serialized as soon as it's read. The memory used doesn't grow with the number
+of pages, the matches of a full text search are a subquery.
+
+The filters are those of the listing's filter form, i.e. the export of
+/en/export/media.csv?region=1 has the media pages of /en/library/?region=1.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import forms
+from . import models
+
+EXPORT_CHUNK_SIZE = getattr(settings, "LIBRARY_EXPORT_CHUNK_SIZE", 500)
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+class MediaExport:
+    model = models.MediaPage
+    form_class = forms.LibraryFilterForm
+    prefetch = ["regions__region", "topics__topic"]
+    fields = [
+        "id",
+        "url",
+        "language",
+        "title",
+        "full_title",
+        "authors",
+        "publisher",
+        "year",
+        "media_type",
+        "link",
+        "regions",
+        "topics",
+        "first_published_at",
+        "last_published_at",
+    ]
+
+    def get_row(self, page):
+        return {
+            "id": page.pk,
+            "url": page.full_url,
+            "language": page.locale.language_code,
+            "title": page.title,
+            "full_title": page.full_title,
+            "authors": page.authors,
+            "publisher": page.publisher,
+            "year": page.year,
+            "media_type": page.media_type,
+            "link": page.link,
+            "regions": [link.region.name for link in page.regions.all()],
+            "topics": [link.topic.name for link in page.topics.all()],
+            "first_published_at": page.first_published_at,
+            "last_published_at": page.last_published_at,
+        }
+
+
+class BusinessExport:
+    model = models.BusinessPage
+    form_class = forms.BusinessFilterForm
+    prefetch = ["regions", "industries", "business_categories", "sources"]
+    fields = [
+        "id",
+        "url",
+        "language",
+        "title",
+        "country",
+        "city",
+        "website",
+        "authors",
+        "regions",
+        "industries",
+        "business_categories",
+        "sources",
+        "first_published_at",
+        "last_published_at",
+    ]
+
+    def get_row(self, page):
+        return {
+            "id": page.pk,
+            "url": page.full_url,
+            "language": page.locale.language_code,
+            "title": page.title,
+            "country": page.country_jurisdiction.code,
+            "city": page.city_jurisdiction,
+            "website": page.website,
+            "authors": page.authors,
+            "regions": [region.name for region in page.regions.all()],
+            "industries": [industry.name for industry in page.industries.all()],
+            "business_categories": [
+                category.name for category in page.business_categories.all()
+            ],
+            "sources": [
+                "{}: {}".format(source.title, source.url)
+                for source in page.sources.all()
+            ],
+            "first_published_at": page.first_published_at,
+            "last_published_at": page.last_published_at,
+        }
+
+
+EXPORTS = {
+    "media": MediaExport(),
+    "business": BusinessExport(),
+}
+
+
+def get_rows(export, form):
+    """
+    Rows of the live pages of an export matching a valid filter form, in
+    order of their ids
+    """
+    qs = export.model.objects.live().select_related("locale").order_by("id")
+    # Filtered first, so only the pages left are searched
+    qs = form.filter_search(form.filter_queryset(qs))
+    for page in qs.prefetch_related(*export.prefetch).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    ):
+        yield export.get_row(page)
+
+
+class Echo:
+    """
+    A file that returns what's written to it, so csv.writer returns lines
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(fields, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(
+            [
+                "; ".join(value) if isinstance(value, list) else value
+                for value in (row[field] for field in fields)
+            ]
+        )
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def stream_export(export, form, format):
+    """
+    Lines of an export of the pages matching a valid filter form as "csv" or
+    "jsonl"
+    """
+    rows = get_rows(export, form)
+    if format == "csv":
+        return stream_csv(export.fields, rows)
+    return stream_jsonl(rows)
@@ -1,16 +1,200 @@
+import hashlib
+
 from django import forms
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Count
 from django.utils.translation import gettext_lazy as _
+from django_countries import countries
+from wagtail.models import Locale
 
 from . import models
+from migcontrol.utils import get_cache_generation
+
+
+# Counts are keyed by the generation of what they count, so they never go
+# stale. The timeout is to not keep counts of filter combinations nobody uses
+# anymore.
+LIBRARY_FACETS_CACHE_TIMEOUT = getattr(
+    settings, "LIBRARY_FACETS_CACHE_TIMEOUT", 60 * 60 * 24
+)
+
+# Fields to order by for the order_by choices, relevance is the search's own
+ORDERINGS = {"title": "title_sort", "-year": "-year"}
+
+
+def count_values(values, page="id"):
+    """
+    {value: number of pages} of a values_list() of one field of pages or of
+    their relations, in one grouped query. page is the field of the page id,
+    so a page linked to a value more than once is counted once.
+    """
+    return dict(values.annotate(count=Count(page, distinct=True)).order_by())
+
+
+def filter_related(qs, through, field, translation_key):
+    """
+    Filters pages by a snippet they are linked to through a model with a
+    "page" and a snippet field, in any of the snippet's translations.
+
+    The search backend can only filter on the page's own FilterFields, so
+    this is a subquery of page ids.
+    """
+    return qs.filter(
+        id__in=through.objects.filter(
+            **{field + "__translation_key": translation_key}
+        ).values("page_id")
+    )
+
+
+def count_related(qs, through, field):
+    """
+    {snippet translation key: number of pages in qs linked to it}
+    """
+    return count_values(
+        through.objects.filter(page__in=qs).values_list(field + "__translation_key"),
+        page="page",
+    )
+
+
+class SnippetChoiceField(forms.ChoiceField):
+    """
+    A choice of one of the (id, name, translation key) snippets it's given,
+    cleaned to the translation key, so it matches the snippet in every locale
+    without querying it.
+    """
+
+    def __init__(self, *, empty_label, **kwargs):
+        super().__init__(**kwargs)
+        self.empty_label = empty_label
+        self.snippets = []
+
+    @property
+    def snippets(self):
+        return self._snippets
+
+    @snippets.setter
+    def snippets(self, snippets):
+        self._snippets = snippets
+        self.translation_keys = {
+            str(pk): translation_key for pk, __, translation_key in snippets
+        }
+        self.choices = [("", self.empty_label)] + [
+            (pk, name) for pk, name, __ in snippets
+        ]
+
+    def clean(self, value):
+        return self.translation_keys.get(super().clean(value))
+
+
+class FacetFilterForm(forms.Form):
+    """
+    A filter form of which the fields listed in facets show how many pages
+    choosing each of their values would give.
 
+    Subclasses implement filter_<facet>(qs, value) to filter a queryset by a
+    facet and count_<facet>(qs) to count {value: number of pages} of a
+    queryset, and name the cache generation of the pages they count.
+    """
+
+    facets = []
+    generation = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.facet_counts = {}
+
+    def with_count(self, facet, key, label):
+        if facet not in self.facet_counts:
+            return label
+        return "{} ({})".format(label, self.facet_counts[facet].get(key, 0))
+
+    def filter_queryset(self, qs, exclude=None):
+        """
+        Applies the chosen facets to a queryset, except the one named exclude
+        """
+        for facet in self.facets:
+            value = self.cleaned_data.get(facet)
+            if facet != exclude and value not in (None, ""):
+                qs = getattr(self, "filter_" + facet)(qs, value)
+        return qs
+
+    def apply_filter(self, qs):
+        if not self.cleaned_data:
+            return qs
+        return self.filter_queryset(qs)
+
+    def get_facet_counts(self, qs):
+        """
+        {facet: {choice: number of pages}} for a queryset.
+
+        Every facet is counted with all the other chosen filters applied, but
+        not its own, so the counts show what choosing another value would
+        give. Cached per combination of filters until the generation of the
+        pages changes.
+        """
+        key = "facets-{}-{}-{}".format(
+            self.generation,
+            get_cache_generation(self.generation),
+            hashlib.md5(
+                repr(
+                    sorted(
+                        (name, str(value)) for name, value in self.cleaned_data.items()
+                    )
+                    + [str(qs.query)]
+                ).encode()
+            ).hexdigest(),
+        )
+        counts = cache.get(key)
+        if counts is None:
+            counts = self.count_facets(
+                qs.order_by().select_related(None).prefetch_related(None)
+            )
+            cache.set(key, counts, LIBRARY_FACETS_CACHE_TIMEOUT)
+        self.set_facet_counts(counts)
+        return counts
+
+    def filter_search(self, qs):
+        """
+        Restricts a queryset to the pages matching the form's full text
+        search, for forms that have one. Filter the queryset first, so only
+        the pages left are searched.
+        """
+        return qs
+
+    def count_facets(self, qs):
+        qs = self.filter_search(qs)
+        return {
+            facet: getattr(self, "count_" + facet)(
+                self.filter_queryset(qs, exclude=facet)
+            )
+            for facet in self.facets
+        }
+
+    def set_facet_counts(self, counts):
+        """
+        Shows the counts next to the choices of the facets
+        """
+        self.facet_counts = counts
+        for facet in self.facets:
+            field = self.fields[facet]
+            if isinstance(field, SnippetChoiceField):
+                field.choices = [("", field.empty_label)] + [
+                    (pk, self.with_count(facet, translation_key, name))
+                    for pk, name, translation_key in field.snippets
+                ]
+
+
+class LibraryFilterForm(FacetFilterForm):
+    facets = ["region", "topic", "language", "media_type", "year"]
+    generation = "library"
 
-class LibraryFilterForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields["region"].label_from_instance = self.region_label_from_instance
-        self.fields["topic"].label_from_instance = self.topic_label_from_instance
+        self.fields["region"].snippets = models.get_snippet_choices(
+            models.RegionSnippet
+        )
+        self.fields["topic"].snippets = models.get_snippet_choices(models.TopicSnippet)
 
     language = forms.ChoiceField(
         required=False,
@@ -20,15 +204,29 @@ class LibraryFilterForm(forms.Form):
         ]
         + settings.LANGUAGES,
     )
-    region = forms.ModelChoiceField(
-        queryset=models.RegionSnippet.objects.all().order_by("name"),
+    region = SnippetChoiceField(
         required=False,
         label=_("Region"),
+        empty_label=_("All regions"),
     )
-    topic = forms.ModelChoiceField(
-        queryset=models.TopicSnippet.objects.all().order_by("name"),
+    topic = SnippetChoiceField(
         required=False,
         label=_("Topic"),
+        empty_label=_("All topics"),
+    )
+    media_type = forms.ChoiceField(
+        required=False,
+        label=_("Media type"),
+        choices=[
+            ("", _("All media types")),
+        ]
+        + models.MEDIA_TYPES,
+    )
+    # The choices are the years that have media, see set_facet_counts()
+    year = forms.IntegerField(
+        required=False,
+        label=_("Year of publication"),
+        widget=forms.Select(choices=[("", _("All years"))]),
     )
 
     search_query = forms.CharField(
@@ -38,42 +236,170 @@ class LibraryFilterForm(forms.Form):
 
     order_by = forms.ChoiceField(
         choices=[
+            ("relevance", _("Relevance")),
             ("title", _("Title")),
             ("-year", _("Year published")),
         ],
-        initial="title",
+        initial="relevance",
         required=False,
     )
 
-    @staticmethod
-    def region_label_from_instance(obj):
-        return obj.name
+    def filter_topic(self, qs, topic):
+        return filter_related(qs, models.MediaPageTopic, "topic", topic)
+
+    def filter_region(self, qs, region):
+        return filter_related(qs, models.MediaPageRegion, "region", region)
+
+    def filter_language(self, qs, language):
+        return qs.filter(locale__in=Locale.objects.filter(language_code=language))
+
+    def filter_media_type(self, qs, media_type):
+        return qs.filter(media_type=media_type)
+
+    def filter_year(self, qs, year):
+        return qs.filter(year=year)
+
+    def count_topic(self, qs):
+        return count_related(qs, models.MediaPageTopic, "topic")
+
+    def count_region(self, qs):
+        return count_related(qs, models.MediaPageRegion, "region")
+
+    def count_language(self, qs):
+        return count_values(qs.values_list("locale__language_code"))
 
-    @staticmethod
-    def topic_label_from_instance(obj):
-        return obj.name
+    def count_media_type(self, qs):
+        return count_values(qs.values_list("media_type"))
+
+    def count_year(self, qs):
+        return count_values(qs.values_list("year"))
 
     def apply_filter(self, qs):
+        """
+        Filters a MediaPage queryset. With a search query, the result is a
+        search backend result set, ranked by relevance unless another order
+        is chosen.
+        """
         cd = self.cleaned_data
         if not cd:
             return qs
 
-        if cd["topic"]:
-            qs = qs.filter(topics__topic=cd["topic"])
-
-        if cd["region"]:
-            qs = qs.filter(regions__region=cd["region"])
+        qs = self.filter_queryset(qs)
 
-        if cd["language"]:
-            qs = qs.filter(locale__language_code=cd["language"])
+        order_by = ORDERINGS.get(cd["order_by"])
 
         if cd["search_query"]:
-            qs = qs.filter(
-                Q(title__icontains=cd["search_query"])
-                | Q(body__icontains=cd["search_query"])
+            if not order_by:
+                return qs.search(cd["search_query"])
+            return qs.order_by(order_by, "id").search(
+                cd["search_query"], order_by_relevance=False
             )
 
-        if cd["order_by"]:
-            qs = qs.order_by(cd["order_by"])
+        if order_by:
+            qs = qs.order_by(order_by, "id")
 
         return qs
+
+    def filter_search(self, qs):
+        query = self.cleaned_data.get("search_query")
+        if not query:
+            return qs
+        # Searched once, the database search backend's results are a
+        # queryset of the matches, which is used as a subquery
+        results = qs.select_related(None).search(query, order_by_relevance=False)
+        return qs.filter(id__in=results.get_queryset().values("id"))
+
+    def set_facet_counts(self, counts):
+        super().set_facet_counts(counts)
+        for facet in ["language", "media_type"]:
+            field = self.fields[facet]
+            field.choices = [
+                (value, self.with_count(facet, value, label) if value else label)
+                for value, label in field.choices
+            ]
+        self.fields["year"].widget.choices = [("", _("All years"))] + [
+            (year, self.with_count("year", year, year))
+            for year in sorted(
+                (year for year in counts["year"] if year is not None), reverse=True
+            )
+        ]
+
+
+class BusinessFilterForm(FacetFilterForm):
+    facets = ["country", "region", "industry", "business_category"]
+    generation = "business"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Countries are listed in the request language
+        self.fields["country"].choices = [("", _("All countries"))] + list(countries)
+        self.fields["region"].snippets = models.get_snippet_choices(
+            models.RegionSnippet
+        )
+        self.fields["industry"].snippets = models.get_snippet_choices(
+            models.IndustrySnippet
+        )
+        self.fields["business_category"].snippets = models.get_snippet_choices(
+            models.BusinessCategorySnippet
+        )
+
+    country = forms.ChoiceField(
+        required=False,
+        label=_("Registered office"),
+    )
+    region = SnippetChoiceField(
+        required=False,
+        label=_("Region"),
+        empty_label=_("All regions"),
+    )
+    industry = SnippetChoiceField(
+        required=False,
+        label=_("Industry"),
+        empty_label=_("All industries"),
+    )
+    business_category = SnippetChoiceField(
+        required=False,
+        label=_("Category"),
+        empty_label=_("All categories"),
+    )
+
+    def filter_country(self, qs, country):
+        return qs.filter(country_jurisdiction=country)
+
+    def filter_region(self, qs, region):
+        return filter_related(qs, models.BusinessPageRegion, "region", region)
+
+    def filter_industry(self, qs, industry):
+        return filter_related(qs, models.BusinessPageIndustry, "industry", industry)
+
+    def filter_business_category(self, qs, business_category):
+        return filter_related(
+            qs,
+            models.BusinessPageBusinessCategory,
+            "business_category",
+            business_category,
+        )
+
+    def count_country(self, qs):
+        return count_values(qs.values_list("country_jurisdiction"))
+
+    def count_region(self, qs):
+        return count_related(qs, models.BusinessPageRegion, "region")
+
+    def count_industry(self, qs):
+        return count_related(qs, models.BusinessPageIndustry, "industry")
+
+    def count_business_category(self, qs):
+        return count_related(
+            qs, models.BusinessPageBusinessCategory, "business_category"
+        )
+
+    def set_facet_counts(self, counts):
+        super().set_facet_counts(counts)
+        # Only the countries that have businesses, and the chosen one
+        chosen = self.cleaned_data.get("country")
+        self.fields["country"].choices = [("", _("All countries"))] + [
+            (code, self.with_count("country", code, name))
+            for code, name in countries
+            if code in counts["country"] or code == chosen
+        ]
@@ -0,0 +1,57 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from library.export import CONTENT_TYPES
+from library.export import EXPORTS
+from library.export import stream_export
+
+
+class Command(BaseCommand):
+    """
+    Writes the live pages of the library ("media") or the business directory
+    ("business") as CSV or JSON lines, streamed in chunks so exports of any
+    size fit in memory.
+
+    Filters are the fields of the listing's filter form, i.e.
+
+    ./manage.py export_library media --filter region=1 --filter year=2020
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(EXPORTS))
+        parser.add_argument(
+            "--format",
+            choices=list(CONTENT_TYPES),
+            default="csv",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write to, instead of standard output",
+        )
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="FIELD=VALUE",
+            help="Filter like the listing's filter form does, can be repeated",
+        )
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options["kind"]]
+        if any("=" not in value for value in options["filter"]):
+            raise CommandError("Filters are given as FIELD=VALUE")
+        form = export.form_class(
+            dict(value.split("=", 1) for value in options["filter"])
+        )
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        lines = stream_export(export, form, options["format"])
+        if not options["output"]:
+            sys.stdout.writelines(lines)
+            return
+        with open(options["output"], "w", newline="") as f:
+            f.writelines(lines)
+        print("Wrote {}".format(options["output"]))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from library.citations import get_citations_file_urls
+from library.citations import write_citations_files
+
+
+class Command(BaseCommand):
+    """
+    Writes the BibTeX and RIS citations of the whole library to the files
+    that the library page links to.
+
+    They are written again whenever a media page is published, unpublished
+    or deleted, so this is only needed to write them the first time.
+    """
+
+    def handle(self, *args, **options):
+        write_citations_files()
+        for url in get_citations_file_urls().values():
+            print("Wrote {}".format(url))
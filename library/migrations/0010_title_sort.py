@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_auto_20240424_1900'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businesspage',
+            name='title_sort',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='mediapage',
+            name='title_sort',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from migcontrol.utils import get_sort_key
+
+
+def fill_title_sort(apps, schema_editor):
+    for model_name in ["library.MediaPage", "library.BusinessPage"]:
+        model = apps.get_model(model_name)
+        pages = []
+        for page in model.objects.only("id", "title", "title_sort").iterator():
+            page.title_sort = get_sort_key(page.title)[:255]
+            pages.append(page)
+        model.objects.bulk_update(pages, ["title_sort"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0010_title_sort"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_title_sort, migrations.RunPython.noop),
+    ]
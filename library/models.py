@@ -1,6 +1,12 @@
 from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
+from django.core.paginator import PageNotAnInteger
+from django.core.paginator import Paginator
 from django.db import models
-from django.db.models.functions import Collate
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
@@ -13,11 +19,24 @@ from wagtail.fields import RichTextField
 from wagtail.fields import StreamField
 from wagtail.images import get_image_model_string
 from wagtail.images.blocks import ImageChooserBlock
+from wagtail.models import Locale
 from wagtail.models import Page
 from wagtail.models.i18n import TranslatableMixin
+from wagtail.search import index
+from wagtail.signals import page_published
+from wagtail.signals import page_unpublished
 from wagtail.snippets.models import register_snippet
-from wagtail.templatetags.wagtailcore_tags import richtext
 
+from home.models import AuthorsMixin
+from home.models import SortTitleMixin
+from migcontrol.rich_text import richtext
+from migcontrol.utils import bump_cache_generation
+from migcontrol.utils import get_cache_generation
+from migcontrol.utils import get_sort_key
+
+LIBRARY_PAGINATION_PER_PAGE = getattr(settings, "LIBRARY_PAGINATION_PER_PAGE", 50)
+
+BUSINESS_PAGINATION_PER_PAGE = getattr(settings, "BUSINESS_PAGINATION_PER_PAGE", 25)
 
 MEDIA_TYPES = [
     ("PDF", "PDF"),
@@ -68,6 +87,62 @@ class TopicSnippet(TranslatableMixin, models.Model):
         return f"{self.name}"
 
 
+def paginate(request, qs, per_page):
+    """
+    (the page of qs from the "page" GET parameter, the other GET parameters
+    for the pagination links)
+    """
+    paginator = Paginator(qs, per_page)
+    try:
+        page = paginator.page(request.GET.get("page"))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+
+    query = request.GET.copy()
+    query.pop("page", None)
+    return page, query.urlencode()
+
+
+def get_snippet_choices(model):
+    """
+    [(id, name, translation key)] of the snippets of a model in the active
+    language, or in the default language where they aren't translated, ordered
+    by name. Cached until a snippet used by the filters changes.
+    """
+    language_code = get_language()
+    key = "library-choices-{}-{}-{}".format(
+        model._meta.model_name,
+        language_code,
+        get_cache_generation("library-snippets"),
+    )
+    choices = cache.get(key)
+    if choices is None:
+        try:
+            active = Locale.objects.get_for_language(language_code)
+        except (LookupError, Locale.DoesNotExist):
+            # A language that isn't a content language or has no locale yet
+            active = Locale.get_default()
+        preferred = [Locale.get_default().pk, active.pk]
+        snippets = {}
+        for pk, name, translation_key, locale_id in model.objects.values_list(
+            "pk", "name", "translation_key", "locale_id"
+        ):
+            rank = preferred.index(locale_id) if locale_id in preferred else -1
+            if rank >= snippets.get(translation_key, (-2,))[0]:
+                snippets[translation_key] = (rank, pk, name)
+        choices = sorted(
+            (
+                (pk, name, translation_key)
+                for translation_key, (__, pk, name) in snippets.items()
+            ),
+            key=lambda choice: get_sort_key(choice[1]),
+        )
+        cache.set(key, choices, None)
+    return choices
+
+
 @register_snippet
 class IndustrySnippet(TranslatableMixin, models.Model):
 
@@ -144,27 +219,30 @@ class LibraryIndexPage(Page):
     ]
 
     def get_context(self, request):
+        from .citations import get_citations_file_urls
         from .forms import LibraryFilterForm
 
         context = super().get_context(request)
 
         filter_form = LibraryFilterForm(request.GET)
 
-        if (
-            get_language() == "de"
-            and "postgres" in settings.DATABASES["default"]["ENGINE"]
-        ):
-            ordering = Collate("title", "de-x-icu")
-        else:
-            ordering = "title"
-
-        qs = MediaPage.objects.all().live().order_by(ordering).specific()
+        qs = (
+            MediaPage.objects.live()
+            .order_by("title_sort", "id")
+            .select_related("feature_image")
+            .prefetch_related("regions__region", "topics__topic")
+        )
 
         if filter_form.is_valid():
+            context["facet_counts"] = filter_form.get_facet_counts(qs)
             qs = filter_form.apply_filter(qs)
 
+        media_pages, filter_query = paginate(request, qs, LIBRARY_PAGINATION_PER_PAGE)
+
         context["filter_form"] = filter_form
-        context["media_pages"] = qs
+        context["media_pages"] = media_pages
+        context["citations_file_urls"] = get_citations_file_urls()
+        context["filter_query"] = filter_query
         return context
 
 
@@ -200,7 +278,7 @@ class MediaPageTopic(models.Model):
         unique_together = ("page", "topic")
 
 
-class MediaPage(Page):
+class MediaPage(AuthorsMixin, SortTitleMixin, Page):
 
     body = RichTextField()
 
@@ -263,6 +341,17 @@ class MediaPage(Page):
         RegionSnippet, through=MediaPageRegion, blank=True
     )
 
+    search_fields = Page.search_fields + [
+        index.SearchField("body"),
+        index.SearchField("full_title", boost=2),
+        index.SearchField("authors"),
+        index.SearchField("publisher"),
+        index.AutocompleteField("authors"),
+        index.FilterField("title_sort"),
+        index.FilterField("year"),
+        index.FilterField("media_type"),
+    ]
+
     @property
     def some_image(self):
         return self.feature_image
@@ -310,18 +399,28 @@ class BusinessIndexPage(Page):
     ]
 
     def get_context(self, request):
+        from .forms import BusinessFilterForm
+
         context = super().get_context(request)
-        if (
-            get_language() == "de"
-            and "postgres" in settings.DATABASES["default"]["ENGINE"]
-        ):
-            ordering = Collate("title", "de-x-icu")
-        else:
-            ordering = "title"
 
-        context["business_pages"] = (
-            self.get_children().live().type(BusinessPage).specific().order_by(ordering)
+        filter_form = BusinessFilterForm(request.GET)
+
+        qs = BusinessPage.objects.child_of(self).live().order_by("title_sort", "id")
+
+        if filter_form.is_valid():
+            context["facet_counts"] = filter_form.get_facet_counts(qs)
+            qs = filter_form.apply_filter(qs)
+
+        # What the listing shows of every business, in one query each per page
+        qs = qs.prefetch_related("industries", "business_categories", "sources")
+
+        business_pages, filter_query = paginate(
+            request, qs, BUSINESS_PAGINATION_PER_PAGE
         )
+
+        context["filter_form"] = filter_form
+        context["business_pages"] = business_pages
+        context["filter_query"] = filter_query
         return context
 
 
@@ -401,7 +500,7 @@ class BusinessPageBusinessPageSource(models.Model):
         unique_together = ("page", "businesspage_source")
 
 
-class BusinessPage(Page):
+class BusinessPage(AuthorsMixin, SortTitleMixin, Page):
     template = "library/business/business_page.html"
 
     country_jurisdiction = CountryField(
@@ -477,3 +576,36 @@ class BusinessPage(Page):
     ]
 
     meta_panels = Page.promote_panels + ["authors"]
+
+
+@receiver(page_published, sender=MediaPage)
+@receiver(page_unpublished, sender=MediaPage)
+@receiver(post_delete, sender=MediaPage)
+def media_page_changed(sender, **kwargs):
+    from .citations import mark_citations_files
+
+    bump_cache_generation("library")
+    mark_citations_files()
+
+
+@receiver(page_published, sender=BusinessPage)
+@receiver(page_unpublished, sender=BusinessPage)
+@receiver(post_delete, sender=BusinessPage)
+def business_page_changed(sender, **kwargs):
+    bump_cache_generation("business")
+
+
+@receiver(post_save, sender=RegionSnippet)
+@receiver(post_save, sender=TopicSnippet)
+@receiver(post_save, sender=IndustrySnippet)
+@receiver(post_save, sender=BusinessCategorySnippet)
+@receiver(post_delete, sender=RegionSnippet)
+@receiver(post_delete, sender=TopicSnippet)
+@receiver(post_delete, sender=IndustrySnippet)
+@receiver(post_delete, sender=BusinessCategorySnippet)
+def library_snippet_changed(sender, **kwargs):
+    bump_cache_generation("library-snippets")
+    # Pages show the snippets' names, and deleting a snippet unlinks it from
+    # the pages, which changes the facet counts
+    bump_cache_generation("library")
+    bump_cache_generation("business")
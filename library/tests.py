@@ -0,0 +1,330 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import override_settings
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.utils import translation
+from wagtail.models import Locale
+from wagtail.models import Site
+
+from library.citations import escape_bibtex
+from library.citations import to_bibtex
+from library.citations import to_ris
+from library.citations import write_citations_files
+from library.export import EXPORTS
+from library.export import get_rows
+from library.forms import LibraryFilterForm
+from library.models import get_snippet_choices
+from library.models import MediaPage
+from library.models import MediaPageRegion
+from library.models import RegionSnippet
+from migcontrol.utils import bump_cache_generation
+from migcontrol.utils import get_cache_generation
+
+
+class CacheGenerationTest(TestCase):
+    def get_generations(self):
+        return [
+            get_cache_generation(name)
+            for name in ["library", "business", "library-snippets"]
+        ]
+
+    def test_snippet_changed(self):
+        generations = self.get_generations()
+        region = RegionSnippet.objects.create(name="Sahel", locale=Locale.get_default())
+        saved = self.get_generations()
+        region.delete()
+        deleted = self.get_generations()
+        for before, after, last in zip(generations, saved, deleted):
+            self.assertNotEqual(before, after)
+            self.assertNotEqual(after, last)
+
+
+class EscapeBibtexTest(SimpleTestCase):
+    def test_escape_bibtex(self):
+        self.assertEqual(
+            escape_bibtex(r"50% of $5 & {more} #1 a_b ~ ^ \ Überblick"),
+            r"50\% of \$5 \& \{more\} \#1 a\_b \textasciitilde{} "
+            r"\textasciicircum{} \textbackslash{} Überblick",
+        )
+
+
+class CitationTest(TestCase):
+    def setUp(self):
+        self.de, __ = Locale.objects.get_or_create(language_code="de")
+
+    def get_page(self, **kwargs):
+        return MediaPage(
+            pk=12,
+            title="Migration",
+            body="<p>Text</p>",
+            locale=self.de,
+            link="https://example.org/a_report",
+            **kwargs
+        )
+
+    def test_to_bibtex(self):
+        page = self.get_page(
+            authors="Jane Doe and John Smith",
+            full_title="Migration & {Control}",
+            publisher="Journal of Migration",
+            year=2020,
+            media_type="Article",
+        )
+        self.assertEqual(
+            to_bibtex(page),
+            "@article{doe2020-12,\n"
+            "  author = {Jane Doe and John Smith},\n"
+            "  title = {{Migration \\& \\{Control\\}}},\n"
+            "  journal = {Journal of Migration},\n"
+            "  year = {2020},\n"
+            "  url = {https://example.org/a\\_report}\n"
+            "}\n\n",
+        )
+
+    def test_to_bibtex_empty_fields(self):
+        self.assertEqual(
+            to_bibtex(
+                self.get_page(authors="", publisher="", year=None, media_type="Essay")
+            ),
+            "@misc{anonnd-12,\n"
+            "  title = {{Migration}},\n"
+            "  url = {https://example.org/a\\_report}\n"
+            "}\n\n",
+        )
+
+    def test_to_ris(self):
+        page = self.get_page(
+            authors="Jane  Doe,\nJohn Smith",
+            full_title="Migration\r\n and  control ",
+            publisher="Migration\nControl",
+            year=2020,
+            media_type="Book",
+        )
+        self.assertEqual(
+            to_ris(page),
+            "TY  - BOOK\r\n"
+            "AU  - Jane Doe\r\n"
+            "AU  - John Smith\r\n"
+            "TI  - Migration and control\r\n"
+            "PB  - Migration Control\r\n"
+            "PY  - 2020\r\n"
+            "UR  - https://example.org/a_report\r\n"
+            "LA  - de\r\n"
+            "ER  - \r\n",
+        )
+
+
+class CitationsFilesTest(TestCase):
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        self.pages = [
+            home.add_child(
+                instance=MediaPage(
+                    title="Media {}".format(index),
+                    slug="test-media-{}".format(index),
+                    body="<p>Text</p>",
+                    authors="Jane Doe",
+                    year=2020,
+                    live=False,
+                )
+            )
+            for index in range(2)
+        ]
+
+    def test_written_once_per_transaction(self):
+        with mock.patch("library.citations.write_citations_files") as write:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                for page in self.pages:
+                    page.save_revision().publish()
+        self.assertGreater(len(callbacks), 1)
+        write.assert_called_once_with()
+
+    def test_write_citations_files(self):
+        for page in self.pages:
+            page.save_revision().publish()
+        with tempfile.TemporaryDirectory() as root:
+            with override_settings(MEDIA_ROOT=root):
+                write_citations_files()
+                # Written again, they replace the files
+                write_citations_files()
+                directory = os.path.join(root, "library", "citations")
+                self.assertEqual(
+                    sorted(os.listdir(directory)), ["library.bib", "library.ris"]
+                )
+                with open(os.path.join(directory, "library.bib")) as f:
+                    bibtex = f.read()
+        for page in self.pages:
+            self.assertIn("@misc{{doe2020-{},".format(page.pk), bibtex)
+
+
+class LibrarySearchTest(TestCase):
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        self.region = RegionSnippet.objects.create(
+            name="Sahel", locale=Locale.get_default()
+        )
+        self.pages = {
+            slug: home.add_child(
+                instance=MediaPage(
+                    title=title,
+                    slug=slug,
+                    body="<p>Text</p>",
+                    year=year,
+                    media_type=media_type,
+                    regions=[MediaPageRegion(region=self.region)] if region else [],
+                )
+            )
+            for slug, title, year, media_type, region in [
+                ("test-match", "Border report", 2020, "PDF", True),
+                ("test-other-year", "Border report", 2019, "PDF", True),
+                ("test-other-type", "Border report", 2020, "Essay", True),
+                ("test-no-region", "Border report", 2020, "PDF", False),
+                ("test-no-match", "Sea rescue", 2020, "PDF", True),
+            ]
+        }
+        self.form = LibraryFilterForm(
+            {
+                "search_query": "border",
+                "region": str(self.region.pk),
+                "year": "2020",
+                "media_type": "PDF",
+                "language": "en",
+                "order_by": "relevance",
+            }
+        )
+        self.assertTrue(self.form.is_valid())
+
+    def test_search_and_filters(self):
+        qs = MediaPage.objects.live().order_by("title_sort", "id")
+        match = self.pages["test-match"]
+        self.assertEqual([page.pk for page in self.form.apply_filter(qs)], [match.pk])
+        self.assertEqual(
+            [row["id"] for row in get_rows(EXPORTS["media"], self.form)], [match.pk]
+        )
+
+    def test_search_facet_counts(self):
+        counts = self.form.get_facet_counts(MediaPage.objects.live())
+        # Every facet counts the search matches with the other filters
+        self.assertEqual(counts["year"], {2019: 1, 2020: 1})
+        self.assertEqual(counts["media_type"], {"PDF": 1, "Essay": 1})
+        self.assertEqual(counts["region"], {self.region.translation_key: 1})
+        self.assertEqual(counts["language"], {"en": 1})
+
+
+class FacetCountsTest(TestCase):
+    def setUp(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        self.region = RegionSnippet.objects.create(
+            name="Sahel", locale=Locale.get_default()
+        )
+        de, __ = Locale.objects.get_or_create(language_code="de")
+        self.region_de = self.region.copy_for_translation(de)
+        self.region_de.save()
+        for slug, year, regions in [
+            ("test-both", 2020, [self.region, self.region_de]),
+            ("test-one", 2020, [self.region_de]),
+            ("test-none", 2019, []),
+        ]:
+            home.add_child(
+                instance=MediaPage(
+                    title="Report",
+                    slug=slug,
+                    body="<p>Text</p>",
+                    year=year,
+                    regions=[MediaPageRegion(region=region) for region in regions],
+                )
+            )
+
+    def get_counts(self, data):
+        form = LibraryFilterForm(data)
+        self.assertTrue(form.is_valid())
+        return form.get_facet_counts(MediaPage.objects.live())
+
+    def test_translations_counted_once(self):
+        counts = self.get_counts({})
+        # A page linked to two translations of a region is one page
+        self.assertEqual(counts["region"], {self.region.translation_key: 2})
+        self.assertEqual(counts["year"], {2019: 1, 2020: 2})
+
+    def test_filtered_counts(self):
+        # Matches the pages linked to any translation of the region
+        counts = self.get_counts({"region": str(self.region.pk)})
+        self.assertEqual(counts["region"], {self.region.translation_key: 2})
+        self.assertEqual(counts["year"], {2020: 2})
+
+    def test_cache_key(self):
+        with mock.patch.object(
+            LibraryFilterForm, "count_facets", autospec=True
+        ) as count_facets:
+            count_facets.return_value = {
+                facet: {} for facet in LibraryFilterForm.facets
+            }
+            self.get_counts({"year": "2020"})
+            self.get_counts({"year": "2020"})
+            self.assertEqual(count_facets.call_count, 1)
+            # Other filters, or a change of the pages, are counted again
+            self.get_counts({"year": "2019"})
+            self.assertEqual(count_facets.call_count, 2)
+            bump_cache_generation("library")
+            self.get_counts({"year": "2020"})
+            self.assertEqual(count_facets.call_count, 3)
+
+
+class SnippetChoicesTest(TestCase):
+    def setUp(self):
+        self.de, __ = Locale.objects.get_or_create(language_code="de")
+        self.sahel = RegionSnippet.objects.create(
+            name="Sahel", locale=Locale.get_default()
+        )
+        self.balkans = RegionSnippet.objects.create(
+            name="Balkans", locale=Locale.get_default()
+        )
+        self.sahel_de = self.sahel.copy_for_translation(self.de)
+        self.sahel_de.name = "Sahelzone"
+        self.sahel_de.save()
+
+    def get_choices(self, language_code):
+        with translation.override(language_code):
+            return get_snippet_choices(RegionSnippet)
+
+    def test_choices(self):
+        self.assertEqual(
+            self.get_choices("en"),
+            [
+                (self.balkans.pk, "Balkans", self.balkans.translation_key),
+                (self.sahel.pk, "Sahel", self.sahel.translation_key),
+            ],
+        )
+        # Untranslated snippets are in the default language
+        self.assertEqual(
+            self.get_choices("de"),
+            [
+                (self.balkans.pk, "Balkans", self.balkans.translation_key),
+                (self.sahel_de.pk, "Sahelzone", self.sahel.translation_key),
+            ],
+        )
+
+    def test_language_without_locale(self):
+        # Falls back to the default locale
+        self.assertEqual(self.get_choices("xx"), self.get_choices("en"))
+
+    def test_region_matched_across_translations(self):
+        home = Site.objects.get(is_default_site=True).root_page
+        page = home.add_child(
+            instance=MediaPage(
+                title="Report",
+                slug="test-report",
+                body="<p>Text</p>",
+                regions=[MediaPageRegion(region=self.sahel)],
+            )
+        )
+        with translation.override("de"):
+            form = LibraryFilterForm({"region": str(self.sahel_de.pk)})
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["region"], self.sahel.translation_key)
+        self.assertEqual(
+            list(form.apply_filter(MediaPage.objects.live())), [page.specific]
+        )
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import views
+
+
+app_name = "library"
+
+urlpatterns = [
+    path("citations/<int:pk>.<slug:format>", views.citation_view, name="citation"),
+    path("<slug:kind>.<slug:format>", views.export_view, name="export"),
+]
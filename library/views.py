@@ -0,0 +1,55 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404
+from django.http import HttpResponse
+from django.http import HttpResponseBadRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from . import citations
+from .export import CONTENT_TYPES
+from .export import EXPORTS
+from .export import stream_export
+from .models import MediaPage
+
+
+@staff_member_required
+def export_view(request, kind, format):
+    """
+    Streams the pages of the library ("media") or the business directory
+    ("business") as CSV or JSON lines, filtered by the GET parameters of the
+    listing's filter form.
+    """
+    if kind not in EXPORTS or format not in CONTENT_TYPES:
+        raise Http404("No such export")
+
+    export = EXPORTS[kind]
+    form = export.form_class(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(
+            form.errors.as_text(), content_type="text/plain; charset=utf-8"
+        )
+
+    response = StreamingHttpResponse(
+        stream_export(export, form, format), content_type=CONTENT_TYPES[format]
+    )
+    response["Content-Disposition"] = 'attachment; filename="{}-{}.{}"'.format(
+        kind, timezone.now().date().isoformat(), format
+    )
+    return response
+
+
+def citation_view(request, pk, format):
+    """
+    The citation of a live media page as BibTeX ("bib") or RIS ("ris")
+    """
+    if format not in citations.FORMATS:
+        raise Http404("No such citation format")
+
+    page = get_object_or_404(MediaPage.objects.live().select_related("locale"), pk=pk)
+    render, content_type = citations.FORMATS[format]
+    response = HttpResponse(render(page), content_type=content_type)
+    response["Content-Disposition"] = 'attachment; filename="{}.{}"'.format(
+        page.slug, format
+    )
+    return response
@@ -0,0 +1,192 @@
+"""
+Rich text expansion that resolves links and embeds in bulk.
+
+Wagtail's expand_db_html() looks up every <a linktype="page">,
+<a linktype="document"> and <embed embedtype="image"> with its own queries.
+Imported Wordpress content carries dozens of those in a single body, so here
+we collect all the referenced ids first, load the objects in a few queries and
+then rewrite the HTML from what was loaded. Missing image renditions are
+created together as well.
+"""
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from wagtail.documents import get_document_model
+from wagtail.images import get_image_model
+from wagtail.images.formats import get_image_format
+from wagtail.models import Locale
+from wagtail.models import Page
+from wagtail.rich_text import features
+from wagtail.rich_text import RichText
+from wagtail.rich_text.rewriters import EmbedRewriter
+from wagtail.rich_text.rewriters import extract_attrs
+from wagtail.rich_text.rewriters import FIND_A_TAG
+from wagtail.rich_text.rewriters import FIND_EMBED_TAG
+from wagtail.rich_text.rewriters import LinkRewriter
+from wagtail.rich_text.rewriters import MultiRuleRewriter
+
+from images.image_formats import get_renditions
+
+
+def get_references(html):
+    """
+    Collects the ids of all pages and documents referenced in
+    database-representation HTML, and the images with the filter spec of the
+    format they are embedded with.
+
+    Returns (page ids, document ids, {(image id, filter spec)})
+    """
+    page_ids = set()
+    document_ids = set()
+    image_embeds = set()
+
+    for match in FIND_A_TAG.findall(html):
+        attrs = extract_attrs(match)
+        if not attrs.get("id", "").isdigit():
+            continue
+        if attrs.get("linktype") == "page":
+            page_ids.add(int(attrs["id"]))
+        elif attrs.get("linktype") == "document":
+            document_ids.add(int(attrs["id"]))
+
+    for match in FIND_EMBED_TAG.findall(html):
+        attrs = extract_attrs(match)
+        if attrs.get("embedtype") != "image" or not attrs.get("id", "").isdigit():
+            continue
+        try:
+            filter_spec = get_image_format(attrs["format"]).filter_spec
+        except KeyError:
+            continue
+        image_embeds.add((int(attrs["id"]), filter_spec))
+
+    return page_ids, document_ids, image_embeds
+
+
+def get_localized_pages(page_ids):
+    """
+    {id: page} for the given ids, where each page is replaced by its live
+    translation in the active locale if there is one (like Page.localized)
+    """
+    pages = {page.id: page for page in Page.objects.filter(id__in=page_ids).specific()}
+
+    if not getattr(settings, "WAGTAIL_I18N_ENABLED", False):
+        return pages
+
+    try:
+        locale = Locale.get_active()
+    except (LookupError, Locale.DoesNotExist):
+        return pages
+
+    translation_keys = {
+        page.translation_key for page in pages.values() if page.locale_id != locale.id
+    }
+    if not translation_keys:
+        return pages
+
+    translations = {
+        page.translation_key: page
+        for page in Page.objects.filter(
+            translation_key__in=translation_keys, locale=locale, live=True
+        ).specific()
+    }
+    return {
+        page_id: translations.get(page.translation_key, page)
+        for page_id, page in pages.items()
+    }
+
+
+def get_page_link_rule(page_ids):
+    pages = get_localized_pages(page_ids)
+
+    def expand_page_link(attrs):
+        page = pages.get(int(attrs["id"])) if attrs["id"].isdigit() else None
+        if not page:
+            return "<a>"
+        return '<a href="%s">' % escape(page.url)
+
+    return expand_page_link
+
+
+def get_document_link_rule(document_ids):
+    documents = get_document_model().objects.in_bulk(document_ids)
+
+    def expand_document_link(attrs):
+        doc = documents.get(int(attrs["id"])) if attrs["id"].isdigit() else None
+        if not doc:
+            return "<a>"
+        return '<a href="%s">' % escape(doc.url)
+
+    return expand_document_link
+
+
+def get_image_embed_rule(image_embeds):
+    images = get_image_model().objects.in_bulk({i for i, __ in image_embeds})
+    renditions = get_renditions(
+        [(images[i], spec) for i, spec in image_embeds if i in images]
+    )
+
+    def expand_image_embed(attrs):
+        image = images.get(int(attrs["id"])) if attrs["id"].isdigit() else None
+        if not image:
+            return '<img alt="">'
+        image_format = get_image_format(attrs["format"])
+        rendition = renditions.get((image.id, image_format.filter_spec))
+        if rendition and hasattr(image_format, "rendition_to_html"):
+            return image_format.rendition_to_html(
+                image, rendition, attrs.get("alt", "")
+            )
+        return image_format.image_to_html(image, attrs.get("alt", ""))
+
+    return expand_image_embed
+
+
+def expand_db_html(html):
+    """
+    Expand database-representation HTML into proper HTML usable on front-end
+    templates, the same as wagtail.rich_text.expand_db_html
+    """
+    page_ids, document_ids, image_embeds = get_references(html)
+
+    link_rules = {
+        linktype: handler.expand_db_attributes
+        for linktype, handler in features.get_link_types().items()
+    }
+    embed_rules = {
+        embedtype: handler.expand_db_attributes
+        for embedtype, handler in features.get_embed_types().items()
+    }
+
+    if page_ids:
+        link_rules["page"] = get_page_link_rule(page_ids)
+    if document_ids:
+        link_rules["document"] = get_document_link_rule(document_ids)
+    if image_embeds:
+        embed_rules["image"] = get_image_embed_rule(image_embeds)
+
+    rewriter = MultiRuleRewriter(
+        [
+            LinkRewriter(link_rules),
+            EmbedRewriter(embed_rules),
+        ]
+    )
+    return rewriter(html)
+
+
+def richtext(value):
+    """
+    Replacement for Wagtail's richtext template filter using the bulk
+    expand_db_html
+    """
+    if isinstance(value, RichText):
+        value = value.source
+    if value is None:
+        html = ""
+    elif isinstance(value, str):
+        html = expand_db_html(value)
+    else:
+        raise TypeError(
+            "'richtext' received an invalid value; expected string, got {}.".format(
+                type(value)
+            )
+        )
+    return render_to_string("wagtailcore/shared/richtext.html", {"html": html})
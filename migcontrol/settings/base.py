@@ -108,6 +108,24 @@ DATABASES = {
     }
 }
 
+# Cached listings, counts and feeds are invalidated by changing generation
+# tokens (see migcontrol.utils.get_cache_generation). The tokens are kept in
+# their own cache, which has to be shared by all the processes serving the
+# site, so a change saved by one of them is seen by all. Everything else can
+# be in a fast per-process cache, production.py uses Memcached for both.
+# Run "python manage.py createcachetable" to create the table.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        # Cached blog cards and facet counts are many small entries
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "generations": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "migcontrol_cache",
+    },
+}
+
 LOCALE_PATHS = [os.path.join(BASE_DIR, "locale")]
 
 LOGGING = {
@@ -273,4 +291,17 @@ WAGTAILMARKDOWN = {
 
 WAGTAILIMAGES_IMAGE_MODEL = "images.CustomImage"
 
+# BeautifulSoup parser used for processing page bodies (header anchors, TOCs)
+# and in the Wordpress importer. One of "lxml", "html.parser" or "html5lib".
+# html5lib is by far the slowest, but parses exactly like a browser does. The
+# others put headers with unclosed tags in them elsewhere, see ParserTest in
+# migcontrol/tests.py. Run "python manage.py check_html_parsers" before
+# switching.
+MIGCONTROL_HTML_PARSER = "html5lib"
+
+# Paginate blog listings with ?after=/?before= cursors on (date, id) instead
+# of page numbers, so older pages don't need a COUNT and an OFFSET scan.
+# Existing ?page= links keep working either way.
+BLOG_PAGINATION_CURSOR = False
+
 WAGTAILADMIN_BASE_URL = "/wagtail"
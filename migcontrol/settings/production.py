@@ -1,3 +1,5 @@
+import os
+
 from .base import *  # noqa
 
 DEBUG = False
@@ -5,6 +7,24 @@ DEBUG = False
 COMPRESS_ENABLED = True
 COMPRESS_OFFLINE = True
 
+# A cache that all processes share, so the generation tokens don't need the
+# database. When Memcached is down, nothing is cached but the site still
+# works.
+MEMCACHED_LOCATION = os.environ.get("MEMCACHED_LOCATION", "127.0.0.1:11211")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": MEMCACHED_LOCATION,
+        "OPTIONS": {"ignore_exc": True},
+    },
+    "generations": {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": MEMCACHED_LOCATION,
+        "KEY_PREFIX": "generations",
+        "OPTIONS": {"ignore_exc": True},
+    },
+}
+
 try:
     from .local import *  # noqa
 except ImportError:
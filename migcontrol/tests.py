@@ -0,0 +1,140 @@
+import re
+
+from django.test import SimpleTestCase
+
+from migcontrol.utils import get_toc
+from migcontrol.utils import HTML_PARSERS
+from migcontrol.utils import parse_authors
+from migcontrol.utils import process_body
+
+# {name: (body, header ids, TOC)} of bodies that every parser processes the
+# same
+BODIES = {
+    "nested": (
+        "<h2>Intro</h2><p>Text</p><h3>Background</h3><h4>Detail</h4><h2>End</h2>",
+        ["header-intro", "header-background", "header-detail", "header-end"],
+        [("Intro", [("Background", [("Detail", [])])]), ("End", [])],
+    ),
+    "skipped level": (
+        "<h2>A</h2><h4>Deep</h4><h3>Mid</h3>",
+        ["header-a", "header-deep", "header-mid"],
+        [("A", [("Deep", []), ("Mid", [])])],
+    ),
+    "entities": (
+        "<h2>Flucht &amp; Migration</h2><p>&nbsp;&euro; caf&eacute;</p>"
+        "<h3>&Auml;rzte &#8211; &quot;Zitat&quot;</h3>",
+        ["header-flucht-migration", "header-ärzte-zitat"],
+        [("Flucht & Migration", [('Ärzte – "Zitat"', [])])],
+    ),
+    "footnotes": (
+        '<p>Text<footnote id="1a2b">[1a2b]</footnote></p>'
+        '<h2>Notes <footnote id="3c">[3c]</footnote></h2>',
+        ["header-notes-3c"],
+        [("Notes [3c]", [])],
+    ),
+    "unicode": (
+        "<h2>الهجرة</h2><h3>Überblick</h3>",
+        ["header-الهجرة", "header-überblick"],
+        [("الهجرة", [("Überblick", [])])],
+    ),
+    "stray tags": (
+        "<p>a</div><h2>A</h2></span><h3>B</p></h3><p><h2>In p</h2></p>",
+        ["header-a", "header-b", "header-in-p"],
+        [("A", [("B", [])]), ("In p", [])],
+    ),
+}
+
+header_id_re = re.compile(r'\bid="(header-[^"]*)"')
+
+
+class TocTest(SimpleTestCase):
+    def test_nested(self):
+        self.assertEqual(
+            get_toc("<h2>A</h2><h3>A.1</h3><h4>A.1.a</h4><h3>A.2</h3><h2>B</h2>"),
+            [
+                ("A", [("A.1", [("A.1.a", [])]), ("A.2", [])]),
+                ("B", []),
+            ],
+        )
+
+    def test_skipped_level(self):
+        # h4 right after h2 is still a child of the h2
+        self.assertEqual(
+            get_toc("<h2>A</h2><h4>A.a</h4><h4>A.b</h4><h3>A.1</h3><h2>B</h2>"),
+            [
+                ("A", [("A.a", []), ("A.b", []), ("A.1", [])]),
+                ("B", []),
+            ],
+        )
+
+    def test_deeper_header_first(self):
+        # A shallower header after a deeper one closes it, even when the
+        # body doesn't start with the shallowest level
+        self.assertEqual(
+            get_toc("<h4>A</h4><h3>B</h3><h4>B.1</h4><h2>C</h2><h3>C.1</h3>"),
+            [
+                ("A", []),
+                ("B", [("B.1", [])]),
+                ("C", [("C.1", [])]),
+            ],
+        )
+
+    def test_no_headers(self):
+        self.assertEqual(get_toc(""), [])
+        self.assertEqual(get_toc("<p>No headers</p><h6>Not in the TOC</h6>"), [])
+
+
+class ParserTest(SimpleTestCase):
+    def process_body(self, body, parser):
+        html, toc = process_body(body, parser=parser)
+        return header_id_re.findall(html), toc
+
+    def test_parsers(self):
+        for name, (body, ids, toc) in BODIES.items():
+            for parser in HTML_PARSERS:
+                with self.subTest(name, parser=parser):
+                    self.assertEqual(self.process_body(body, parser), (ids, toc))
+
+    def test_footnote_tags_are_kept(self):
+        body = BODIES["footnotes"][0]
+        for parser in HTML_PARSERS:
+            with self.subTest(parser=parser):
+                html, __ = process_body(body, parser=parser)
+                self.assertIn('<footnote id="1a2b">[1a2b]</footnote>', html)
+                self.assertIn('<footnote id="3c">[3c]</footnote>', html)
+
+    def test_unclosed_tags(self):
+        # Only html5lib closes the header where a browser would, which is why
+        # it's the default parser
+        self.assertEqual(
+            self.process_body("<h2>Open<p>Para<h3>Sub</h3><p>x", "html5lib"),
+            (["header-openpara", "header-sub"], [("OpenPara", [("Sub", [])])]),
+        )
+
+
+class ParseAuthorsTest(SimpleTestCase):
+    def test_parse_authors(self):
+        for authors, names in [
+            ("Jane Doe", ["Jane Doe"]),
+            ("Jane Doe and John Doe", ["Jane Doe", "John Doe"]),
+            ("Jane Doe, John Doe & Alice", ["Jane Doe", "John Doe", "Alice"]),
+            ("Jane Doe, and John Doe", ["Jane Doe", "John Doe"]),
+            (
+                "Jane Doe; John Doe / Alice AND Bob",
+                ["Jane Doe", "John Doe", "Alice", "Bob"],
+            ),
+            # "and" only separates as a word
+            ("Andrea Anderson and Sandy", ["Andrea Anderson", "Sandy"]),
+            ("Jane Doe,", ["Jane Doe"]),
+            # Commas within "Surname, Given name"
+            ("Doe, Jane; Smith, John", ["Doe, Jane", "Smith, John"]),
+            ("Doe, Jane and Smith, John", ["Doe, Jane", "Smith, John"]),
+            ("Doe, Jane", ["Doe, Jane"]),
+            ("Jane Doe, Alice", ["Jane Doe, Alice"]),
+            (" Jane Doe, John Doe, ", ["Jane Doe", "John Doe"]),
+            (" , ", []),
+            ("", []),
+            (None, []),
+        ]:
+            with self.subTest(authors):
+                self.assertEqual(parse_authors(authors), names)
@@ -11,6 +11,7 @@ from wagtail_footnotes import urls as footnotes_urls
 from blog import urls as blog_urls
 from home.views import NewsletterSignup
 from home.views import NewsletterSignupValid
+from library import urls as library_urls
 from search import views as search_views
 
 urlpatterns = [
@@ -35,6 +36,7 @@ urlpatterns += i18n_patterns(
     path("wagtail/", include(wagtailadmin_urls)),
     path("search/", search_views.search, name="search"),
     path("blog/", include(blog_urls)),
+    path("export/", include(library_urls)),
     path("newsletter/", NewsletterSignup.as_view(), name="newsletter"),
     path(
         "newsletter/thanks/", NewsletterSignupValid.as_view(), name="newsletter_valid"
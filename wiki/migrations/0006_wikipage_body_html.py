@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0005_alter_wikiindexpage_body'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wikipage',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0006_wikipage_body_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wikipage',
+            name='toc',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0007_wikipage_toc'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wikipage',
+            name='footnote_numbers',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0008_wikipage_footnote_numbers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wikipage',
+            name='title_sort',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from migcontrol.utils import get_sort_key
+
+
+def fill_title_sort(apps, schema_editor):
+    WikiPage = apps.get_model("wiki.WikiPage")
+    pages = []
+    for page in WikiPage.objects.only("id", "title", "title_sort").iterator():
+        page.title_sort = get_sort_key(page.title)[:255]
+        pages.append(page)
+    WikiPage.objects.bulk_update(pages, ["title_sort"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wiki", "0009_wikipage_title_sort"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_title_sort, migrations.RunPython.noop),
+    ]
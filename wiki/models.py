@@ -1,9 +1,4 @@
-from bs4 import BeautifulSoup
-from django.conf import settings
 from django.db import models
-from django.db.models.functions import Collate
-from django.utils.text import slugify
-from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from modelcluster.fields import ParentalKey
@@ -17,9 +12,11 @@ from wagtail.images.blocks import ImageChooserBlock
 from wagtail.models import Page
 from wagtail.models.i18n import TranslatableMixin
 from wagtail.snippets.models import register_snippet
-from wagtail.templatetags.wagtailcore_tags import richtext
 
-from migcontrol.utils import get_toc
+from home.models import AuthorsMixin
+from home.models import RenderedBodyMixin
+from home.models import SortTitleMixin
+from migcontrol.rich_text import richtext
 
 
 @register_snippet
@@ -59,13 +56,6 @@ class WikiIndexPage(Page):
     ]
 
     def get_context(self, request):
-        if (
-            get_language() == "de"
-            and "postgres" in settings.DATABASES["default"]["ENGINE"]
-        ):
-            ordering = Collate("title", "de-x-icu")
-        else:
-            ordering = "title"
         context = super().get_context(request)
         context["wiki_pages"] = (
             self.get_children()
@@ -78,7 +68,9 @@ class WikiIndexPage(Page):
                 "locale__language_code",
                 "wikipage__wiki_categories__wiki_category__name",
             )
-            .order_by("wikipage__wiki_categories__wiki_category__name", ordering)
+            .order_by(
+                "wikipage__wiki_categories__wiki_category__name", "wikipage__title_sort"
+            )
         )
         return context
 
@@ -103,7 +95,7 @@ class WikiPageWikiCategory(models.Model):
         unique_together = ("page", "wiki_category")
 
 
-class WikiPage(Page):
+class WikiPage(AuthorsMixin, RenderedBodyMixin, SortTitleMixin, Page):
 
     wordpress_post_id = models.PositiveSmallIntegerField(
         blank=True, null=True, editable=False
@@ -170,27 +162,5 @@ class WikiPage(Page):
         InlinePanel("footnotes", label="Footnotes"),
     ]
 
-    def get_toc(self):
-        """
-        [(name, [*children])]
-        """
-        return get_toc(self.get_body())
-
-    def get_body(self):  # noqa: max-complexity=11
-        body = richtext(self.description)
-
-        # Now let's add some id=... attributes to all h{1,2,3,4,5}
-        soup = BeautifulSoup(body, "html5lib")
-
-        # Beautiful soup unfortunately adds some noise to the structure, so we
-        # remove this again - see:
-        # https://stackoverflow.com/questions/21452823/beautifulsoup-how-should-i-obtain-the-body-contents
-        for attr in ["head", "html", "body"]:
-            if hasattr(soup, attr):
-                getattr(soup, attr).unwrap()
-
-        # Now let's add some id=... attributes to all h{1,2,3,4,5}
-        for element in soup.find_all(["h1", "h2", "h3", "h4", "h5"]):
-            element["id"] = "header-" + slugify(element.text, allow_unicode=True)
-
-        return str(soup)
+    def render_body(self):
+        return richtext(self.description)